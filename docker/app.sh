@@ -2,4 +2,4 @@
 
 alembic upgrade head
 cd src
-gunicorn -k uvicorn.workers.UvicornWorker -b 0.0.0.0:8000 main:app
\ No newline at end of file
+gunicorn -c ../docker/gunicorn.conf.py main:app
@@ -0,0 +1,26 @@
+import gc
+import multiprocessing
+import os
+
+bind = "0.0.0.0:8000"
+worker_class = "uvicorn.workers.UvicornWorker"
+# Воркеры асинхронные, одного на ядро достаточно. Без этой настройки
+# gunicorn запускает один воркер и preload_app ничего не дает.
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+
+# Приложение импортируется один раз в мастер-процессе, воркеры получают
+# его память через copy-on-write вместо того, чтобы импортировать заново.
+preload_app = True
+
+
+def when_ready(server):
+    # Объекты, созданные при импорте, больше не трогает сборщик мусора,
+    # поэтому страницы памяти остаются общими для всех воркеров.
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    from database import engine
+
+    # Соединения из пула мастера не должны переходить в воркеры.
+    engine.sync_engine.dispose(close=False)
@@ -8,10 +8,11 @@ from sqlalchemy import pool
 
 sys.path.append(os.path.join(sys.path[0], "src"))
 
-from src.config import DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASS
-from src.auth.models import base as base_auth
-from src.ads.models import base as base_ads
-from src.complaints.models import base as base_complaints
+from config import DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASS
+from database import base
+import ads.models  # noqa: F401
+import auth.models  # noqa: F401
+import complaints.models  # noqa: F401
 
 
 config = context.config
@@ -26,9 +27,7 @@ config.set_section_option(section, "DB_PASS", DB_PASS)
 if config.config_file_name is not None:
     fileConfig(config.config_file_name)
 
-target_metadata = [
-    base_auth.metadata, base_ads.metadata, base_complaints.metadata
-]
+target_metadata = base.metadata
 
 
 def run_migrations_offline() -> None:
@@ -0,0 +1,26 @@
+"""Ad views
+
+Revision ID: a1ab4da3b941
+Revises: 3d3bd76e486c
+Create Date: 2026-10-19 14:10:12.482913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a1ab4da3b941'
+down_revision: Union[str, None] = '3d3bd76e486c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('ad', sa.Column('views', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('ad', 'views')
@@ -0,0 +1,34 @@
+"""Ad soft delete
+
+Revision ID: f7958f036e8d
+Revises: a1ab4da3b941
+Create Date: 2026-10-19 14:30:41.207365
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f7958f036e8d'
+down_revision: Union[str, None] = 'a1ab4da3b941'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('ad', sa.Column('deleted_at', sa.DateTime(timezone=True), nullable=True))
+    op.create_index('ix_ad_type_created_at_active', 'ad', ['type', sa.text('created_at DESC')], unique=False, postgresql_where=sa.text('deleted_at IS NULL'))
+    op.create_index('ix_comment_ad_id_created_at', 'comment', ['ad_id', sa.text('created_at DESC')], unique=False)
+    op.create_index('ix_review_ad_id_created_at', 'review', ['ad_id', sa.text('created_at DESC')], unique=False)
+    op.create_index(op.f('ix_complaint_for_ad'), 'complaint', ['for_ad'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_complaint_for_ad'), table_name='complaint')
+    op.drop_index('ix_review_ad_id_created_at', table_name='review')
+    op.drop_index('ix_comment_ad_id_created_at', table_name='comment')
+    op.drop_index('ix_ad_type_created_at_active', table_name='ad', postgresql_where=sa.text('deleted_at IS NULL'))
+    op.drop_column('ad', 'deleted_at')
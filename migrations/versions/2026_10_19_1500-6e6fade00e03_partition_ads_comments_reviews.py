@@ -0,0 +1,115 @@
+"""Partition ads, comments and reviews by month
+
+Revision ID: 6e6fade00e03
+Revises: f7958f036e8d
+Create Date: 2026-10-19 15:00:27.913541
+
+Tables are rebuilt as RANGE (created_at) partitioned tables with one
+partition per month and a DEFAULT partition. The primary key of a
+partitioned table has to contain the partition key, so it becomes
+(id, created_at) and foreign keys that point at ad.id are dropped:
+deleted ads are cleaned up by the application (see ads/cleanup.py).
+
+"""
+from datetime import date, datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6e6fade00e03'
+down_revision: Union[str, None] = 'f7958f036e8d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PARTITIONED_TABLES = ('ad', 'comment', 'review')
+PARTITIONS_AHEAD = 3
+
+
+def _next_month(month: date) -> date:
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def _create_partitions(table: str, first: date) -> None:
+    month = date(first.year, first.month, 1)
+    last = datetime.now(timezone.utc).date()
+    for _ in range(PARTITIONS_AHEAD):
+        last = _next_month(last)
+
+    while month <= last:
+        op.execute(
+            f"CREATE TABLE {table}_y{month.year}m{month.month:02d} "
+            f"PARTITION OF {table} FOR VALUES "
+            f"FROM ('{month} 00:00:00+00') TO ('{_next_month(month)} 00:00:00+00')"
+        )
+        month = _next_month(month)
+    op.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+
+
+def _create_user_foreign_keys() -> None:
+    for table in PARTITIONED_TABLES:
+        op.create_foreign_key(f'{table}_user_id_fkey', table, 'user', ['user_id'], ['id'])
+
+
+def _create_indexes() -> None:
+    op.create_index(op.f('ix_ad_id'), 'ad', ['id'], unique=False)
+    op.create_index(op.f('ix_ad_title'), 'ad', ['title'], unique=False)
+    op.create_index('ix_ad_type_created_at_active', 'ad', ['type', sa.text('created_at DESC')], unique=False, postgresql_where=sa.text('deleted_at IS NULL'))
+    op.create_index(op.f('ix_comment_id'), 'comment', ['id'], unique=False)
+    op.create_index('ix_comment_ad_id_created_at', 'comment', ['ad_id', sa.text('created_at DESC')], unique=False)
+    op.create_index(op.f('ix_review_id'), 'review', ['id'], unique=False)
+    op.create_index('ix_review_ad_id_created_at', 'review', ['ad_id', sa.text('created_at DESC')], unique=False)
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    op.drop_constraint('comment_ad_id_fkey', 'comment', type_='foreignkey')
+    op.drop_constraint('review_ad_id_fkey', 'review', type_='foreignkey')
+    op.drop_constraint('complaint_for_ad_fkey', 'complaint', type_='foreignkey')
+
+    for table in PARTITIONED_TABLES:
+        op.execute(f"UPDATE {table} SET created_at = now() WHERE created_at IS NULL")
+        op.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
+        op.execute(
+            f"CREATE TABLE {table} "
+            f"(LIKE {table}_old INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+            f"PARTITION BY RANGE (created_at)"
+        )
+        op.execute(
+            f"ALTER TABLE {table} ALTER COLUMN created_at SET NOT NULL, "
+            f"ALTER COLUMN created_at SET DEFAULT now()"
+        )
+        first = bind.execute(sa.text(f"SELECT min(created_at) FROM {table}_old")).scalar()
+        _create_partitions(table, (first or datetime.now(timezone.utc)).astimezone(timezone.utc).date())
+        op.execute(f"INSERT INTO {table} SELECT * FROM {table}_old")
+        op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+        op.execute(f"DROP TABLE {table}_old")
+        op.create_primary_key(f'{table}_pkey', table, ['id', 'created_at'])
+
+    _create_user_foreign_keys()
+    _create_indexes()
+
+
+def downgrade() -> None:
+    for table in PARTITIONED_TABLES:
+        op.execute(f"ALTER TABLE {table} RENAME TO {table}_partitioned")
+        op.execute(
+            f"CREATE TABLE {table} "
+            f"(LIKE {table}_partitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+        )
+        op.execute(
+            f"ALTER TABLE {table} ALTER COLUMN created_at DROP NOT NULL, "
+            f"ALTER COLUMN created_at DROP DEFAULT"
+        )
+        op.execute(f"INSERT INTO {table} SELECT * FROM {table}_partitioned")
+        op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+        op.execute(f"DROP TABLE {table}_partitioned")
+        op.create_primary_key(f'{table}_pkey', table, ['id'])
+
+    _create_user_foreign_keys()
+    _create_indexes()
+    op.create_foreign_key('comment_ad_id_fkey', 'comment', 'ad', ['ad_id'], ['id'])
+    op.create_foreign_key('review_ad_id_fkey', 'review', 'ad', ['ad_id'], ['id'])
+    op.create_foreign_key('complaint_for_ad_fkey', 'complaint', 'ad', ['for_ad'], ['id'])
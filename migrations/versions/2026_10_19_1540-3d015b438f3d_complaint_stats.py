@@ -0,0 +1,44 @@
+"""Complaint stats per ad
+
+Revision ID: 3d015b438f3d
+Revises: 6e6fade00e03
+Create Date: 2026-10-19 15:40:05.371904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3d015b438f3d'
+down_revision: Union[str, None] = '6e6fade00e03'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('ad_complaint_stats',
+    sa.Column('ad_id', sa.Integer(), nullable=False),
+    sa.Column('complaints_count', sa.Integer(), nullable=False),
+    sa.Column('last_complaint_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('ad_id')
+    )
+    op.create_index('ix_ad_complaint_stats_count_ad_id', 'ad_complaint_stats', [sa.text('complaints_count DESC'), sa.text('ad_id DESC')], unique=False)
+    op.execute(
+        "INSERT INTO ad_complaint_stats (ad_id, complaints_count, last_complaint_at) "
+        "SELECT for_ad, count(*), max(created_at) FROM complaint "
+        "WHERE for_ad IS NOT NULL GROUP BY for_ad"
+    )
+    op.add_column('ad', sa.Column('hidden_at', sa.DateTime(timezone=True), nullable=True))
+    op.drop_index('ix_ad_type_created_at_active', table_name='ad')
+    op.create_index('ix_ad_type_created_at_active', 'ad', ['type', sa.text('created_at DESC')], unique=False, postgresql_where=sa.text('deleted_at IS NULL AND hidden_at IS NULL'))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_ad_type_created_at_active', table_name='ad')
+    op.create_index('ix_ad_type_created_at_active', 'ad', ['type', sa.text('created_at DESC')], unique=False, postgresql_where=sa.text('deleted_at IS NULL'))
+    op.drop_column('ad', 'hidden_at')
+    op.drop_index('ix_ad_complaint_stats_count_ad_id', table_name='ad_complaint_stats')
+    op.drop_table('ad_complaint_stats')
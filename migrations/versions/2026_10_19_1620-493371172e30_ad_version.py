@@ -0,0 +1,26 @@
+"""Ad version for optimistic locking
+
+Revision ID: 493371172e30
+Revises: 3d015b438f3d
+Create Date: 2026-10-19 16:20:41.602318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '493371172e30'
+down_revision: Union[str, None] = '3d015b438f3d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('ad', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('ad', 'version')
@@ -0,0 +1,32 @@
+"""Ad location with geohash index
+
+Revision ID: a8fe035f6b55
+Revises: 493371172e30
+Create Date: 2026-10-19 16:50:12.845307
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a8fe035f6b55'
+down_revision: Union[str, None] = '493371172e30'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('ad', sa.Column('latitude', sa.Float(), nullable=True))
+    op.add_column('ad', sa.Column('longitude', sa.Float(), nullable=True))
+    op.add_column('ad', sa.Column('geohash', sa.String(length=12, collation='C'), nullable=True))
+    op.create_index('ix_ad_type_geohash_active', 'ad', ['type', 'geohash'], unique=False, postgresql_where=sa.text('deleted_at IS NULL AND hidden_at IS NULL AND geohash IS NOT NULL'))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_ad_type_geohash_active', table_name='ad')
+    op.drop_column('ad', 'geohash')
+    op.drop_column('ad', 'longitude')
+    op.drop_column('ad', 'latitude')
@@ -0,0 +1,30 @@
+"""User timeline indexes
+
+Revision ID: 663e2894d09f
+Revises: a8fe035f6b55
+Create Date: 2026-10-19 17:20:41.093516
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '663e2894d09f'
+down_revision: Union[str, None] = 'a8fe035f6b55'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_ad_user_id_created_at', 'ad', ['user_id', sa.text('created_at DESC')], unique=False)
+    op.create_index('ix_comment_user_id_created_at', 'comment', ['user_id', sa.text('created_at DESC')], unique=False)
+    op.create_index('ix_review_user_id_created_at', 'review', ['user_id', sa.text('created_at DESC')], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_review_user_id_created_at', table_name='review')
+    op.drop_index('ix_comment_user_id_created_at', table_name='comment')
+    op.drop_index('ix_ad_user_id_created_at', table_name='ad')
@@ -0,0 +1,26 @@
+"""Ad deleted index
+
+Revision ID: b52c7e1d9f04
+Revises: 663e2894d09f
+Create Date: 2026-10-19 17:40:12.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b52c7e1d9f04'
+down_revision: Union[str, None] = '663e2894d09f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_ad_deleted', 'ad', ['id'], unique=False, postgresql_where=sa.text('deleted_at IS NOT NULL'))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_ad_deleted', table_name='ad', postgresql_where=sa.text('deleted_at IS NOT NULL'))
@@ -0,0 +1,58 @@
+import random
+from datetime import date, timedelta
+
+from fastapi import Query
+from redis.exceptions import RedisError
+
+from ads.models import AdType
+from caching import redis_breaker, redis_client
+from config import ACCESS_LOG_SAMPLE_RATE, logger
+
+ACCESS_LOG_TTL = 2 * 24 * 60 * 60
+LIST_ACCESS_LOG = "access-log:ads-list"
+DETAIL_ACCESS_LOG = "access-log:ad-detail"
+
+
+def _daily_key(name: str, day: date) -> str:
+    return f"{name}:{day.isoformat()}"
+
+
+async def _sample(name: str, member: str):
+    if random.random() >= ACCESS_LOG_SAMPLE_RATE:
+        return
+
+    key = _daily_key(name, date.today())
+    try:
+        async with redis_breaker:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                await pipe.zincrby(key, 1, member).expire(
+                    key, ACCESS_LOG_TTL
+                ).execute()
+    except RedisError as error:
+        logger.warning(f"Не удалось записать выборку обращений: {error}")
+
+
+async def sample_list_access(
+    ads_type: AdType,
+    page: int = Query(ge=1, default=1),
+    size: int = Query(ge=1, le=100),
+):
+    await _sample(LIST_ACCESS_LOG, f"{ads_type.value}:{page}:{size}")
+
+
+async def sample_detail_access(ad_id: int):
+    await _sample(DETAIL_ACCESS_LOG, str(ad_id))
+
+
+async def get_top_accessed(name: str, limit: int) -> list[str]:
+    """Самые частые обращения за сегодня и вчера."""
+    today = date.today()
+    scores = {}
+    for day in (today, today - timedelta(days=1)):
+        members = await redis_client.zrevrange(
+            _daily_key(name, day), 0, limit - 1, withscores=True
+        )
+        for member, score in members:
+            scores[member] = scores.get(member, 0) + score
+
+    return sorted(scores, key=scores.get, reverse=True)[:limit]
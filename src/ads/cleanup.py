@@ -0,0 +1,77 @@
+import functools
+
+from sqlalchemy import delete, exists, select
+
+from ads.models import Ad, Comment, Review
+from complaints.models import AdComplaintStats, Complaint
+from config import PURGE_BATCH_SIZE, PURGE_MAX_BATCHES, logger
+from database import async_session_maker
+from scheduler import exclusive_job
+
+PURGE_LOCK = "ads:purge:lock"
+PURGE_LOCK_TTL = 5 * 60
+
+
+def _deleted_ads():
+    return select(Ad.id).where(Ad.deleted_at.is_not(None))
+
+
+async def _purge_children_batch(session, model, ad_column) -> int:
+    key, = model.__table__.primary_key.columns
+    batch = select(key).where(
+        ad_column.in_(_deleted_ads())
+    ).limit(PURGE_BATCH_SIZE)
+    result = await session.execute(
+        delete(model).where(key.in_(batch.scalar_subquery()))
+    )
+    await session.commit()
+    return result.rowcount
+
+
+async def _purge_ads_batch(session) -> int:
+    batch = _deleted_ads().where(
+        ~exists().where(Comment.ad_id == Ad.id),
+        ~exists().where(Review.ad_id == Ad.id),
+        ~exists().where(Complaint.for_ad == Ad.id),
+    ).limit(PURGE_BATCH_SIZE)
+    result = await session.execute(
+        delete(Ad).where(Ad.id.in_(batch.scalar_subquery()))
+    )
+    await session.commit()
+    return result.rowcount
+
+
+async def _run_batches(purge_batch) -> int:
+    purged = 0
+    for _ in range(PURGE_MAX_BATCHES):
+        count = await purge_batch()
+        purged += count
+        if count < PURGE_BATCH_SIZE:
+            break
+    return purged
+
+
+@exclusive_job(PURGE_LOCK, PURGE_LOCK_TTL)
+async def purge_deleted_ads():
+    """
+    Удаляет комментарии, отзывы, жалобы и статистику жалоб удаленных
+    объявлений, а затем сами объявления. Каждая пачка удаляется
+    в отдельной короткой транзакции, поэтому блокировки не держатся долго.
+    """
+    purged = 0
+    async with async_session_maker() as session:
+        for model, ad_column in (
+            (Comment, Comment.ad_id),
+            (Review, Review.ad_id),
+            (Complaint, Complaint.for_ad),
+            (AdComplaintStats, AdComplaintStats.ad_id),
+        ):
+            purged += await _run_batches(functools.partial(
+                _purge_children_batch, session, model, ad_column
+            ))
+        purged += await _run_batches(
+            functools.partial(_purge_ads_batch, session)
+        )
+
+    if purged:
+        logger.info(f"Удалено записей удаленных объявлений: {purged}")
@@ -0,0 +1,99 @@
+import time
+
+from redis.exceptions import RedisError
+from sqlalchemy import bindparam, update
+
+from ads.models import Ad
+from caching import redis_breaker, redis_client
+from config import TRENDING_HALF_LIFE, TRENDING_MAX_SIZE, logger
+from database import async_session_maker
+from scheduler import exclusive_job
+
+VIEWS_KEY = "ads:views"
+VIEWS_FLUSH_KEY = "ads:views:flushing"
+VIEWS_FLUSH_LOCK = "ads:views:lock"
+VIEWS_FLUSH_LOCK_TTL = 60
+TRENDING_KEY = "ads:trending"
+TRENDING_EPOCH_KEY = "ads:trending:epoch"
+TRENDING_EPOCH_PERIOD = 24 * 60 * 60
+
+
+def _trending_epoch(now: float) -> int:
+    return int(now - now % TRENDING_EPOCH_PERIOD)
+
+
+def _view_weight(now: float) -> float:
+    """
+    Вес просмотра растет со временем, поэтому старые просмотры
+    теряют значение вдвое каждые TRENDING_HALF_LIFE секунд.
+    Чтобы вес не рос бесконечно, отсчет идет от начала текущих суток.
+    """
+    return 2 ** ((now - _trending_epoch(now)) / TRENDING_HALF_LIFE)
+
+
+async def record_view(ad_id: int):
+    now = time.time()
+    try:
+        async with redis_breaker:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                await pipe.hincrby(VIEWS_KEY, ad_id, 1).zincrby(
+                    TRENDING_KEY, _view_weight(now), ad_id
+                ).execute()
+    except RedisError as error:
+        logger.warning(f"Не удалось учесть просмотр объявления: {error}")
+
+
+async def get_trending_ids(size: int) -> list[tuple[int, float]]:
+    try:
+        async with redis_breaker:
+            members = await redis_client.zrevrange(
+                TRENDING_KEY, 0, size - 1, withscores=True
+            )
+    except RedisError as error:
+        logger.warning(f"Не удалось получить популярные объявления: {error}")
+        return []
+    return [(int(ad_id), score) for ad_id, score in members]
+
+
+async def _rescale_trending(now: float):
+    epoch = _trending_epoch(now)
+    previous_epoch = await redis_client.get(TRENDING_EPOCH_KEY)
+    async with redis_client.pipeline(transaction=True) as pipe:
+        if previous_epoch is not None and int(previous_epoch) != epoch:
+            pipe.zunionstore(TRENDING_KEY, {
+                TRENDING_KEY: 2 ** (
+                    (int(previous_epoch) - epoch) / TRENDING_HALF_LIFE
+                )
+            })
+        pipe.set(TRENDING_EPOCH_KEY, epoch)
+        pipe.zremrangebyrank(TRENDING_KEY, 0, -TRENDING_MAX_SIZE - 1)
+        await pipe.execute()
+
+
+@exclusive_job(VIEWS_FLUSH_LOCK, VIEWS_FLUSH_LOCK_TTL)
+async def flush_views():
+    """
+    Переносит накопленные в Redis просмотры в Postgres одним пакетом.
+    Если прошлый перенос упал, он повторяется до того,
+    как будут забраны новые просмотры.
+    """
+    await _rescale_trending(time.time())
+
+    if not await redis_client.exists(VIEWS_FLUSH_KEY):
+        if not await redis_client.exists(VIEWS_KEY):
+            return
+        await redis_client.rename(VIEWS_KEY, VIEWS_FLUSH_KEY)
+
+    views = await redis_client.hgetall(VIEWS_FLUSH_KEY)
+    stmt = update(Ad.__table__).where(
+        Ad.__table__.c.id == bindparam("ad_id")
+    ).values(views=Ad.__table__.c.views + bindparam("count"))
+    async with async_session_maker() as session:
+        await session.execute(stmt, [
+            {"ad_id": int(ad_id), "count": int(count)}
+            for ad_id, count in views.items()
+        ])
+        await session.commit()
+
+    await redis_client.delete(VIEWS_FLUSH_KEY)
+    logger.info(f"Просмотры записаны в базу для {len(views)} объявлений")
@@ -0,0 +1,126 @@
+import asyncio
+import json
+import traceback
+from typing import Iterable, Optional
+
+from fastapi.encoders import jsonable_encoder
+from redis.exceptions import RedisError
+
+from ads.models import AdType
+from caching import pubsub_client, redis_breaker, redis_client
+from config import FEED_BUFFER_SIZE, FEED_HEARTBEAT, logger
+
+FEED_CHANNEL = "ads:feed"
+
+
+def ad_event(
+    event: str, ad: dict, previous_type: Optional[AdType] = None
+) -> dict:
+    message = {"event": event, "ad": ad}
+    if previous_type is not None:
+        message["previous_type"] = previous_type
+    return message
+
+
+async def publish_ad_events(messages: Iterable[dict]):
+    try:
+        async with redis_breaker:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for message in messages:
+                    pipe.publish(
+                        FEED_CHANNEL, json.dumps(jsonable_encoder(message))
+                    )
+                await pipe.execute()
+    except RedisError as error:
+        logger.warning(f"Не удалось опубликовать событие ленты: {error}")
+
+
+async def publish_ad_event(
+    event: str, ad: dict, previous_type: Optional[AdType] = None
+):
+    await publish_ad_events([ad_event(event, ad, previous_type)])
+
+
+class FeedBroadcaster:
+    """
+    Держит одну подписку на канал Redis на воркер и раздает события
+    подключенным клиентам. У каждого клиента своя очередь ограниченного
+    размера: если клиент не успевает читать, старые события вытесняются.
+    """
+
+    def __init__(self):
+        self._subscribers = {ads_type: set() for ads_type in AdType}
+        self._count = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    def subscribe(self, ads_types: Iterable[AdType]) -> asyncio.Queue:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._listen())
+
+        queue = asyncio.Queue(maxsize=FEED_BUFFER_SIZE)
+        for ads_type in set(ads_types):
+            self._subscribers[ads_type].add(queue)
+        self._count += 1
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        for subscribers in self._subscribers.values():
+            subscribers.discard(queue)
+        self._count -= 1
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    def _dispatch(self, data: str):
+        message = json.loads(data)
+        queues = set()
+        for ads_type in (message["ad"]["type"], message.get("previous_type")):
+            if ads_type in AdType.__members__:
+                queues.update(self._subscribers[AdType(ads_type)])
+
+        for queue in queues:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(data)
+
+    async def _listen(self):
+        while True:
+            try:
+                async with pubsub_client.pubsub() as pubsub:
+                    await pubsub.subscribe(FEED_CHANNEL)
+                    async for message in pubsub.listen():
+                        if message["type"] != "message":
+                            continue
+                        # Одно битое сообщение не должно останавливать
+                        # ленту для всех подписчиков.
+                        try:
+                            self._dispatch(message["data"])
+                        except Exception as error:
+                            logger.error(
+                                f"Сообщение ленты пропущено: {error}\n"
+                                f"{message['data']}\n{traceback.format_exc()}"
+                            )
+            except RedisError as error:
+                logger.warning(f"Подписка на ленту прервана: {error}")
+                await asyncio.sleep(1)
+
+
+broadcaster = FeedBroadcaster()
+
+
+async def stream_feed(ads_types: Iterable[AdType]):
+    queue = broadcaster.subscribe(ads_types)
+    try:
+        while True:
+            try:
+                data = await asyncio.wait_for(queue.get(), FEED_HEARTBEAT)
+                yield f"data: {data}\n\n"
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+    finally:
+        broadcaster.unsubscribe(queue)
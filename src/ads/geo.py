@@ -0,0 +1,146 @@
+import math
+from typing import Optional
+
+from fastapi import Query
+from sqlalchemy import and_, func, or_
+
+from ads.models import Ad
+from ads.schemas import GeoFilter
+from errors import BadRequest
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 9
+MAX_COVERING_CELLS = 16
+MAX_RADIUS_KM = 1000
+EARTH_RADIUS_KM = 6371.0
+
+
+def encode(lat: float, lon: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    geohash, bits, char, even = [], 0, 0, True
+    while len(geohash) < precision:
+        value, interval = (lon, lon_range) if even else (lat, lat_range)
+        middle = (interval[0] + interval[1]) / 2
+        char <<= 1
+        if value >= middle:
+            char |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            geohash.append(BASE32[char])
+            bits, char = 0, 0
+    return "".join(geohash)
+
+
+def _cell_size(precision: int) -> tuple[float, float]:
+    bits = 5 * precision
+    return 180.0 / 2 ** (bits // 2), 360.0 / 2 ** ((bits + 1) // 2)
+
+
+def covering_cells(
+    min_lat: float, min_lon: float, max_lat: float, max_lon: float
+) -> list[str]:
+    """
+    Ячейки geohash наибольшей точности, которые покрывают прямоугольник
+    и которых не больше MAX_COVERING_CELLS.
+    """
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = _cell_size(precision)
+        rows = range(
+            int((min_lat + 90) // height),
+            int(min((max_lat + 90) // height, 180 / height - 1)) + 1
+        )
+        columns = range(
+            int((min_lon + 180) // width),
+            int(min((max_lon + 180) // width, 360 / width - 1)) + 1
+        )
+        if len(rows) * len(columns) <= MAX_COVERING_CELLS or precision == 1:
+            return sorted({
+                encode(
+                    -90 + (row + 0.5) * height,
+                    -180 + (column + 0.5) * width,
+                    precision,
+                )
+                for row in rows for column in columns
+            })
+
+
+def bbox_around(
+    lat: float, lon: float, radius: float
+) -> tuple[float, float, float, float]:
+    """Прямоугольник, описанный вокруг круга радиусом radius км."""
+    delta_lat = math.degrees(radius / EARTH_RADIUS_KM)
+    if abs(lat) + delta_lat >= 90:
+        return max(lat - delta_lat, -90), -180, min(lat + delta_lat, 90), 180
+    delta_lon = math.degrees(
+        radius / EARTH_RADIUS_KM / math.cos(math.radians(lat))
+    )
+    return (
+        lat - delta_lat, max(lon - delta_lon, -180),
+        lat + delta_lat, min(lon + delta_lon, 180),
+    )
+
+
+def distance_km(lat: float, lon: float):
+    """Расстояние от точки до объявления по формуле гаверсинусов."""
+    haversine = (
+        func.power(func.sin(func.radians(Ad.latitude - lat) / 2), 2)
+        + func.cos(func.radians(lat)) * func.cos(func.radians(Ad.latitude))
+        * func.power(func.sin(func.radians(Ad.longitude - lon) / 2), 2)
+    )
+    return 2 * EARTH_RADIUS_KM * func.asin(
+        func.sqrt(func.least(haversine, 1.0))
+    )
+
+
+def in_cells(cells: list[str]):
+    # "~" больше любого символа geohash, поэтому каждая ячейка -
+    # диапазон по индексу (type, geohash).
+    return or_(*(
+        and_(Ad.geohash >= cell, Ad.geohash < f"{cell}~") for cell in cells
+    ))
+
+
+def get_geo_filter(
+    lat: Optional[float] = Query(default=None, ge=-90, le=90),
+    lon: Optional[float] = Query(default=None, ge=-180, le=180),
+    radius: Optional[float] = Query(default=None, gt=0, le=MAX_RADIUS_KM),
+    min_lat: Optional[float] = Query(default=None, ge=-90, le=90),
+    min_lon: Optional[float] = Query(default=None, ge=-180, le=180),
+    max_lat: Optional[float] = Query(default=None, ge=-90, le=90),
+    max_lon: Optional[float] = Query(default=None, ge=-180, le=180),
+    after_distance: Optional[float] = None,
+    after_id: Optional[int] = None,
+) -> Optional[GeoFilter]:
+    """
+    Поиск рядом с точкой (lat, lon, radius в км) и/или в прямоугольнике
+    (min_lat, min_lon, max_lat, max_lon). None, если фильтр не задан.
+    """
+    point = (lat, lon)
+    bbox = (min_lat, min_lon, max_lat, max_lon)
+    if all(value is None for value in point + bbox) and radius is None:
+        return None
+
+    if (lat is None) != (lon is None):
+        raise BadRequest("Pass both lat and lon")
+    if radius is not None and lat is None:
+        raise BadRequest("radius requires lat and lon")
+    if any(value is None for value in bbox):
+        if any(value is not None for value in bbox):
+            raise BadRequest("Pass min_lat, min_lon, max_lat and max_lon")
+        if radius is None:
+            raise BadRequest("Pass radius or a bounding box")
+        bbox = bbox_around(lat, lon, radius)
+    elif min_lat > max_lat or min_lon > max_lon:
+        raise BadRequest("Invalid bounding box")
+
+    if lat is None:
+        lat, lon = (bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2
+    return GeoFilter(
+        lat=lat, lon=lon, radius=radius,
+        min_lat=bbox[0], min_lon=bbox[1], max_lat=bbox[2], max_lon=bbox[3],
+        after_distance=after_distance, after_id=after_id,
+    )
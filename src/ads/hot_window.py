@@ -0,0 +1,219 @@
+import json
+from typing import Iterable, Mapping, Optional
+
+from fastapi.encoders import jsonable_encoder
+from redis.exceptions import RedisError, WatchError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ads.models import Ad, AdType, visible_ads
+from caching import redis_breaker, redis_client
+from config import HOT_WINDOW_EXPIRE, HOT_WINDOW_SIZE, logger
+
+# Служебный элемент с наименьшим счетом. Он есть только в окне,
+# построенном из базы. Счет -1: в окне все видимые объявления типа,
+# 0: окно обрезано до HOT_WINDOW_SIZE и за ним есть объявления в базе.
+HOT_WINDOW_BUILT = "built"
+COMPLETE, TRUNCATED = -1, 0
+
+
+def hot_window_key(ads_type: AdType) -> str:
+    return f"ads:hot:{ads_type.value}"
+
+
+def hot_members_key(ads_type: AdType) -> str:
+    return f"ads:hot:{ads_type.value}:members"
+
+
+def hot_version_key(ads_type: AdType) -> str:
+    return f"ads:hot:{ads_type.value}:version"
+
+
+def _member(ad: Mapping) -> str:
+    """Объявление в том виде, в котором его отдает get_list_ads."""
+    return json.dumps(jsonable_encoder({
+        column.name: ad[column.name] for column in Ad.__table__.columns
+    }))
+
+
+def _is_visible(ad: Mapping) -> bool:
+    return ad["deleted_at"] is None and ad["hidden_at"] is None
+
+
+async def rebuild_hot_window(
+    session: AsyncSession, ads_type: AdType
+) -> list[str]:
+    """
+    Заполняет окно новейшими объявлениями типа из базы. Если пока шел
+    запрос к базе объявления менялись (версия окна выросла), окно
+    не перезаписывается, а прочитанное отдается только текущему запросу.
+    """
+    key, members_key = hot_window_key(ads_type), hot_members_key(ads_type)
+    async with redis_client.pipeline(transaction=True) as pipe:
+        await pipe.watch(hot_version_key(ads_type))
+        result = await session.execute(
+            select(*Ad.__table__.columns).where(
+                Ad.type == ads_type, visible_ads()
+            ).order_by(Ad.created_at.desc()).limit(HOT_WINDOW_SIZE)
+        )
+        ads = result.mappings().all()
+        members = [_member(ad) for ad in ads]
+
+        pipe.multi()
+        pipe.delete(key, members_key)
+        pipe.zadd(key, {
+            HOT_WINDOW_BUILT: (
+                COMPLETE if len(ads) < HOT_WINDOW_SIZE else TRUNCATED
+            ),
+            **{
+                member: ad["created_at"].timestamp()
+                for member, ad in zip(members, ads)
+            },
+        })
+        if ads:
+            pipe.hset(members_key, mapping={
+                ad["id"]: member for member, ad in zip(members, ads)
+            })
+        pipe.expire(key, HOT_WINDOW_EXPIRE)
+        pipe.expire(members_key, HOT_WINDOW_EXPIRE)
+        try:
+            await pipe.execute()
+        except WatchError:
+            pass
+    return members
+
+
+async def get_hot_ads(
+    session: AsyncSession, ads_type: AdType, page: int, size: int
+) -> Optional[list[dict]]:
+    """
+    Страница списка из окна без запроса к базе. None, если страница
+    выходит за окно или Redis недоступен: тогда ее читают из базы.
+    Окно строится заново при первом обращении после истечения
+    HOT_WINDOW_EXPIRE, так обновляются счетчики просмотров.
+    """
+    start = (page - 1) * size
+    stop = start + size - 1
+    if stop >= HOT_WINDOW_SIZE:
+        return None
+
+    key = hot_window_key(ads_type)
+    try:
+        async with redis_breaker:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                built, count, members = await pipe.zscore(
+                    key, HOT_WINDOW_BUILT
+                ).zcard(key).zrevrange(key, start, stop).execute()
+            if built is None:
+                members = await rebuild_hot_window(session, ads_type)
+                built = COMPLETE if len(members) < HOT_WINDOW_SIZE else (
+                    TRUNCATED
+                )
+                count = len(members) + 1
+                members = members[start:stop + 1]
+    except RedisError:
+        return None
+
+    # Последний элемент окна - служебный, он не входит в count.
+    if stop >= count - 1 and built != COMPLETE:
+        return None
+    return [
+        json.loads(member) for member in members
+        if member != HOT_WINDOW_BUILT
+    ]
+
+
+async def update_hot_window(ads: Iterable[Mapping]):
+    """
+    Переносит объявления в окно их типа: видимые добавляются,
+    удаленные и скрытые убираются. ads - строки со всеми колонками Ad.
+    Окна, которые еще не построены, не трогаются.
+    """
+    ads = list(ads)
+    try:
+        async with redis_breaker:
+            await _replace([ad["id"] for ad in ads], [
+                ad for ad in ads if _is_visible(ad)
+            ])
+    except RedisError as error:
+        logger.warning(f"Не удалось обновить окно объявлений: {error}")
+
+
+async def remove_from_hot_window(ad_ids: Iterable[int]):
+    try:
+        async with redis_breaker:
+            await _replace(list(ad_ids), [])
+    except RedisError as error:
+        logger.warning(f"Не удалось обновить окно объявлений: {error}")
+
+
+def _fits(ad: Mapping, built: Optional[float], lowest: list) -> bool:
+    """
+    Попадает ли объявление в построенное окно. В обрезанное окно
+    не добавляются объявления старше его последнего: между ними
+    в базе могут быть объявления, которых нет в окне.
+    """
+    if built is None:
+        return False
+    if built == COMPLETE:
+        return True
+    return bool(lowest) and ad["created_at"].timestamp() >= lowest[0][1]
+
+
+async def _replace(ad_ids: list[int], ads: list[Mapping]):
+    """
+    Убирает ad_ids из всех окон и добавляет ads в окна их типов.
+    Версии окон растут даже у непостроенных окон: так построение,
+    которое прочитало базу до изменения, не запишет старые данные.
+    """
+    if not ad_ids:
+        return
+    types = list(AdType)
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for ads_type in types:
+            pipe.incr(hot_version_key(ads_type))
+            pipe.zscore(hot_window_key(ads_type), HOT_WINDOW_BUILT)
+            pipe.zrange(hot_window_key(ads_type), 1, 1, withscores=True)
+            pipe.hmget(hot_members_key(ads_type), ad_ids)
+        replies = await pipe.execute()
+    windows = {
+        ads_type: replies[4 * index + 1:4 * index + 4]
+        for index, ads_type in enumerate(types)
+    }
+
+    trimmed_types = []
+    async with redis_client.pipeline(transaction=True) as pipe:
+        for ads_type, (_, _, old_members) in windows.items():
+            old_members = [
+                member for member in old_members if member is not None
+            ]
+            if old_members:
+                pipe.zrem(hot_window_key(ads_type), *old_members)
+                pipe.hdel(hot_members_key(ads_type), *ad_ids)
+        added_types = set()
+        for ad in ads:
+            ads_type = AdType(ad["type"])
+            built, lowest, _ = windows[ads_type]
+            if not _fits(ad, built, lowest):
+                continue
+            added_types.add(ads_type)
+            member = _member(ad)
+            pipe.zadd(hot_window_key(ads_type), {
+                member: ad["created_at"].timestamp()
+            })
+            pipe.hset(hot_members_key(ads_type), ad["id"], member)
+        for ads_type in added_types:
+            pipe.zremrangebyrank(
+                hot_window_key(ads_type), 1, -HOT_WINDOW_SIZE - 1
+            )
+            trimmed_types.append(ads_type)
+        replies = await pipe.execute()
+
+    # Если окно пришлось обрезать, за ним в базе есть еще объявления.
+    trimmed = replies[len(replies) - len(trimmed_types):]
+    for ads_type, removed in zip(trimmed_types, trimmed):
+        if removed:
+            await redis_client.zadd(
+                hot_window_key(ads_type), {HOT_WINDOW_BUILT: TRUNCATED},
+                xx=True
+            )
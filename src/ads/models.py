@@ -2,13 +2,12 @@ from enum import Enum as PythonEnum
 
 from sqlalchemy import (
     Column, Integer, String, DateTime,
-    Enum, func, ForeignKey, Float, CheckConstraint
+    Enum, func, ForeignKey, Float, CheckConstraint, Index, and_
 )
-from sqlalchemy.orm import relationship, declarative_base
+from sqlalchemy.orm import relationship
 
 from auth.models import User
-
-base = declarative_base()
+from database import base
 
 
 class AdType(str, PythonEnum):
@@ -25,10 +24,53 @@ class Ad(base):
     description = Column(String)
     price = Column(Float)
     type = Column(Enum(AdType))
-    created_at = Column(DateTime(timezone=True), default=func.now())
+    created_at = Column(
+        DateTime(timezone=True), nullable=False,
+        default=func.now(), server_default=func.now()
+    )
     user_id = Column(Integer, ForeignKey(User.id))
-    comments = relationship("Comment", back_populates="ad")
-    reviews = relationship("Review", back_populates="ad")
+    views = Column(Integer, nullable=False, default=0, server_default="0")
+    deleted_at = Column(DateTime(timezone=True), nullable=True)
+    hidden_at = Column(DateTime(timezone=True), nullable=True)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
+    geohash = Column(String(12, collation="C"), nullable=True)
+    comments = relationship(
+        "Comment", back_populates="ad",
+        primaryjoin="Ad.id == foreign(Comment.ad_id)"
+    )
+    reviews = relationship(
+        "Review", back_populates="ad",
+        primaryjoin="Ad.id == foreign(Review.ad_id)"
+    )
+
+    __table_args__ = (
+        Index(
+            "ix_ad_type_created_at_active", type, created_at.desc(),
+            postgresql_where=and_(
+                deleted_at.is_(None), hidden_at.is_(None)
+            )
+        ),
+        Index("ix_ad_user_id_created_at", user_id, created_at.desc()),
+        # Для фоновой очистки: остальные частичные индексы покрывают
+        # только неудаленные объявления.
+        Index(
+            "ix_ad_deleted", id, postgresql_where=deleted_at.is_not(None)
+        ),
+        Index(
+            "ix_ad_type_geohash_active", type, geohash,
+            postgresql_where=and_(
+                deleted_at.is_(None), hidden_at.is_(None),
+                geohash.is_not(None)
+            )
+        ),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+
+def visible_ads():
+    return and_(Ad.deleted_at.is_(None), Ad.hidden_at.is_(None))
 
 
 class Comment(base):
@@ -36,10 +78,22 @@ class Comment(base):
 
     id = Column(Integer, primary_key=True, index=True)
     text = Column(String)
-    created_at = Column(DateTime(timezone=True), default=func.now())
+    created_at = Column(
+        DateTime(timezone=True), nullable=False,
+        default=func.now(), server_default=func.now()
+    )
     user_id = Column(Integer, ForeignKey(User.id))
-    ad_id = Column(Integer, ForeignKey(Ad.id))
-    ad = relationship("Ad", back_populates="comments")
+    ad_id = Column(Integer)
+    ad = relationship(
+        "Ad", back_populates="comments",
+        primaryjoin="Ad.id == foreign(Comment.ad_id)"
+    )
+
+    __table_args__ = (
+        Index("ix_comment_ad_id_created_at", ad_id, created_at.desc()),
+        Index("ix_comment_user_id_created_at", user_id, created_at.desc()),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
 
 
 class Review(base):
@@ -51,8 +105,20 @@ class Review(base):
         Integer, CheckConstraint("rating >= 1 and rating <= 5"),
         nullable=False
     )
-    created_at = Column(DateTime(timezone=True), default=func.now())
+    created_at = Column(
+        DateTime(timezone=True), nullable=False,
+        default=func.now(), server_default=func.now()
+    )
     user_id = Column(Integer, ForeignKey(User.id))
-    ad_id = Column(Integer, ForeignKey(Ad.id))
+    ad_id = Column(Integer)
+
+    ad = relationship(
+        "Ad", back_populates="reviews",
+        primaryjoin="Ad.id == foreign(Review.ad_id)"
+    )
 
-    ad = relationship("Ad", back_populates="reviews")
+    __table_args__ = (
+        Index("ix_review_ad_id_created_at", ad_id, created_at.desc()),
+        Index("ix_review_user_id_created_at", user_id, created_at.desc()),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
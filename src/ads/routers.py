@@ -1,18 +1,43 @@
+import functools
 import traceback
+from typing import Optional
 
-from fastapi import APIRouter, HTTPException, Depends, Query
-from fastapi.responses import JSONResponse
+from fastapi import (
+    APIRouter, HTTPException, Depends, Header, Query, Response
+)
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi_cache.decorator import cache
-from sqlalchemy import select, insert, update, and_
+from sqlalchemy import select, insert, update, and_, func, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from access_log import sample_detail_access, sample_list_access
 from auth.base_config import current_user
 from auth.models import RoleType, User
-from ads.models import Ad, AdType, Comment, Review
-from ads.schemas import AdCreate, CommentCreate, ReviewCreate
+from ads.counters import get_trending_ids, record_view
+from ads.feed import (
+    ad_event, broadcaster, publish_ad_event, publish_ad_events, stream_feed
+)
+from ads.geo import (
+    covering_cells, distance_km, encode, get_geo_filter, in_cells
+)
+from ads.hot_window import (
+    get_hot_ads, remove_from_hot_window, update_hot_window
+)
+from ads.models import Ad, AdType, Comment, Review, visible_ads
+from ads.schemas import (
+    AdCreate, AdsMove, CommentCreate, GeoFilter, ReviewCreate
+)
+from ads.timeline import add_to_timelines, remove_from_timelines
+from caching import (
+    AD_DETAIL_EXPIRE, AD_DETAIL_NAMESPACE, AD_LIST_NAMESPACE, cache_ads,
+    get_cached_ads, invalidate_ads
+)
 from constants import CRITICAL_ERROR
-from config import logger
-from database import get_async_session
+from config import BATCH_CHUNK_SIZE, FEED_MAX_SUBSCRIBERS, logger
+from database import (
+    DatabaseUnavailable, chunked, get_async_session, in_ids
+)
+from fieldsets import field_columns, sparse_fields
 from telegram_bot import send_message_to_telegram
 
 router = APIRouter(
@@ -33,60 +58,281 @@ async def add_ad(
     try:
         ad_values = new_ad.model_dump()
         ad_values["user_id"] = current_user.id
-        stmt = insert(Ad).values(**ad_values)
-        await session.execute(stmt)
+        if new_ad.latitude is not None:
+            ad_values["geohash"] = encode(new_ad.latitude, new_ad.longitude)
+        stmt = insert(Ad).values(**ad_values).returning(*Ad.__table__.columns)
+        result = await session.execute(stmt)
         await session.commit()
+        ad = result.mappings().one()
+        ad_values.update(id=ad["id"], created_at=ad["created_at"])
+        await publish_ad_event("created", ad_values)
+        await update_hot_window([ad])
+        await add_to_timelines(
+            current_user.id, "ad", ad_values["id"], ad_values["created_at"]
+        )
 
         return {
             "status": "success",
             "data": ad_values,
             "details": None
         }
+    except DatabaseUnavailable:
+        raise
     except Exception as error:
         logger.error(f"{error}\n{traceback.format_exc()}")
         send_message_to_telegram(error)
         raise HTTPException(status_code=500, detail=CRITICAL_ERROR)
 
 
+async def _get_nearby_ads(
+    session: AsyncSession, ads_type: AdType, size: int, geo: GeoFilter,
+    fields: Optional[list[str]]
+):
+    distance = distance_km(geo.lat, geo.lon).label("distance")
+    query = select(*field_columns(Ad, fields), distance).where(
+        Ad.type == ads_type,
+        visible_ads(),
+        in_cells(covering_cells(
+            geo.min_lat, geo.min_lon, geo.max_lat, geo.max_lon
+        )),
+        Ad.latitude.between(geo.min_lat, geo.max_lat),
+        Ad.longitude.between(geo.min_lon, geo.max_lon),
+    ).order_by(distance, Ad.id).limit(size)
+    if geo.radius is not None:
+        query = query.where(distance <= geo.radius)
+    if geo.after_distance is not None and geo.after_id is not None:
+        query = query.where(
+            tuple_(distance, Ad.id) > tuple_(geo.after_distance, geo.after_id)
+        )
+    result = (await session.execute(query)).all()
+    data = [{
+        "ad": row.Ad if fields is None else {
+            name: row._mapping[name] for name in fields
+        },
+        "distance": row.distance,
+    } for row in result]
+
+    next_page = None
+    if len(result) == size:
+        last_ad = data[-1]["ad"]
+        next_page = {
+            "after_distance": result[-1].distance,
+            "after_id": last_ad.id if fields is None else last_ad["id"],
+        }
+    return {
+        "status": "success",
+        "data": data,
+        "details": None,
+        "size": size,
+        "next": next_page,
+    }
+
+
 @router.get("/", responses={
+    400: {"description": "Invalid geo filter or fields"},
     500: {"description": "Internal Server Error"}
-})
-@cache(expire=30)
+}, dependencies=[Depends(sample_list_access)])
+@cache(expire=30, namespace=AD_LIST_NAMESPACE)
 async def get_list_ads(
     ads_type: AdType,
     page: int = Query(ge=1, default=1),
     size: int = Query(ge=1, le=100),
+    geo: Optional[GeoFilter] = Depends(get_geo_filter),
+    fields: Optional[list[str]] = Depends(sparse_fields(Ad)),
     session: AsyncSession = Depends(get_async_session)
 ):
     try:
-        query = select(Ad).where(
-            Ad.type == ads_type
-        ).order_by(Ad.created_at.desc()).limit(size).offset((page - 1) * size)
-        result = await session.execute(query)
+        if geo is not None:
+            if page > 1:
+                # Страницы поиска рядом листаются курсором next.
+                return JSONResponse(status_code=400, content={
+                    "status": "error",
+                    "data": None,
+                    "details": "Use next instead of page with geo filter"
+                })
+            return await _get_nearby_ads(session, ads_type, size, geo, fields)
+
+        data = await get_hot_ads(session, ads_type, page, size)
+        if data is None:
+            query = select(*field_columns(Ad, fields)).where(
+                Ad.type == ads_type, visible_ads()
+            ).order_by(Ad.created_at.desc()).limit(size).offset(
+                (page - 1) * size
+            )
+            result = await session.execute(query)
+            data = (
+                result.scalars().all() if fields is None
+                else result.mappings().all()
+            )
+        elif fields is not None:
+            data = [{name: ad[name] for name in fields} for ad in data]
         return {
             "status": "success",
-            "data": result.scalars().all(),
+            "data": data,
             "details": None,
             "page": page,
             "size": size,
         }
+    except DatabaseUnavailable:
+        raise
     except Exception as error:
         logger.error(f"{error}\n{traceback.format_exc()}")
         send_message_to_telegram(error)
         raise HTTPException(status_code=500, detail=CRITICAL_ERROR)
 
 
-@router.get("/{ad_id}", responses={
-    404: {"description": "Ad not found"},
+@router.get("/trending", responses={
     500: {"description": "Internal Server Error"}
 })
 @cache(expire=30)
+async def get_trending_ads(
+    size: int = Query(ge=1, le=100, default=20),
+    session: AsyncSession = Depends(get_async_session)
+):
+    try:
+        trending = await get_trending_ids(size)
+        result = await session.execute(
+            select(Ad).where(
+                in_ids(Ad.id, [ad_id for ad_id, _ in trending]),
+                visible_ads()
+            )
+        )
+        ads = {ad.id: ad for ad in result.scalars().all()}
+        return {
+            "status": "success",
+            "data": [
+                {"ad": ads[ad_id], "score": score}
+                for ad_id, score in trending if ad_id in ads
+            ],
+            "details": None,
+            "size": size,
+        }
+    except DatabaseUnavailable:
+        raise
+    except Exception as error:
+        logger.error(f"{error}\n{traceback.format_exc()}")
+        send_message_to_telegram(error)
+        raise HTTPException(status_code=500, detail=CRITICAL_ERROR)
+
+
+@router.get("/batch", responses={
+    400: {"description": "No ids"},
+    500: {"description": "Internal Server Error"}
+})
+async def get_ads_batch(
+    ids: list[int] = Query(default=[], max_length=300),
+    session: AsyncSession = Depends(get_async_session)
+):
+    try:
+        if not ids:
+            return JSONResponse(status_code=400, content={
+                "status": "error",
+                "data": None,
+                "details": "Pass at least one id"
+            })
+
+        ad_ids = list(dict.fromkeys(ids))
+        ads = await get_cached_ads(ad_ids)
+
+        missed_ids = [ad_id for ad_id in ad_ids if ad_id not in ads]
+        if missed_ids:
+            result = await session.execute(
+                select(Ad).where(
+                    in_ids(Ad.id, missed_ids), visible_ads()
+                )
+            )
+            missed_ads = result.scalars().all()
+            await cache_ads(missed_ads)
+            ads.update((ad.id, ad) for ad in missed_ads)
+
+        return {
+            "status": "success",
+            "data": [ads[ad_id] for ad_id in ad_ids if ad_id in ads],
+            "details": None,
+            "not_found": [ad_id for ad_id in ad_ids if ad_id not in ads],
+        }
+    except DatabaseUnavailable:
+        raise
+    except Exception as error:
+        logger.error(f"{error}\n{traceback.format_exc()}")
+        send_message_to_telegram(error)
+        raise HTTPException(status_code=500, detail=CRITICAL_ERROR)
+
+
+@router.get("/feed", responses={
+    503: {"description": "Too many subscribers"}
+})
+async def get_ads_feed(ads_type: list[AdType] = Query(default=list(AdType))):
+    if broadcaster.count >= FEED_MAX_SUBSCRIBERS:
+        return JSONResponse(status_code=503, content={
+            "status": "error",
+            "data": None,
+            "details": "Too many subscribers"
+        })
+
+    return StreamingResponse(
+        stream_feed(ads_type), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def _ad_etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def _version_etag(func):
+    """
+    Заменяет ETag кеша (W/ и хеш ответа) на версию объявления, которую
+    принимает If-Match. Ставится над @cache, поэтому работает и для
+    ответа из кеша.
+    """
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        result = await func(*args, **kwargs)
+        if isinstance(result, Response):
+            return result
+
+        ad = result["data"]
+        etag = _ad_etag(
+            ad["version"] if isinstance(ad, dict) else ad.version
+        )
+        request, response = kwargs.get("request"), kwargs.get("response")
+        if request is None or response is None:
+            return result
+        if request.headers.get("If-None-Match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        response.headers["ETag"] = etag
+        return result
+
+    return wrapper
+
+
+def _count_view(func):
+    """Учитывает просмотр только для найденного объявления (ответ 200)."""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        result = await func(*args, **kwargs)
+        if not isinstance(result, Response) and kwargs.get("request"):
+            await record_view(kwargs["ad_id"])
+        return result
+
+    return wrapper
+
+
+@router.get("/{ad_id}", responses={
+    304: {"description": "Not modified"},
+    404: {"description": "Ad not found"},
+    500: {"description": "Internal Server Error"}
+}, dependencies=[Depends(sample_detail_access)])
+@_count_view
+@_version_etag
+@cache(expire=AD_DETAIL_EXPIRE, namespace=AD_DETAIL_NAMESPACE)
 async def get_detail_ad(
     ad_id: int, session: AsyncSession = Depends(get_async_session)
 ):
     try:
         ad = await session.get(Ad, ad_id)
-        if ad is None:
+        if ad is None or ad.deleted_at or ad.hidden_at:
             return JSONResponse(status_code=404, content={
                     "status": "error",
                     "data": None,
@@ -98,20 +344,60 @@ async def get_detail_ad(
             "data": ad,
             "details": None
         }
+    except DatabaseUnavailable:
+        raise
     except Exception as error:
         logger.error(f"{error}\n{traceback.format_exc()}")
         send_message_to_telegram(error)
         raise HTTPException(status_code=500, detail=CRITICAL_ERROR)
 
 
+async def _move_ads(session: AsyncSession, ads_type: AdType, old_ads):
+    old_ads = old_ads.with_for_update().subquery()
+    result = await session.execute(
+        update(Ad).where(Ad.id == old_ads.c.id).values(
+            type=ads_type, version=Ad.version + 1
+        ).returning(
+            *Ad.__table__.columns, old_ads.c.type.label("previous_type")
+        )
+    )
+    moved = result.mappings().all()
+    await session.commit()
+
+    await invalidate_ads([ad["id"] for ad in moved])
+    await update_hot_window(moved)
+    await publish_ad_events(
+        ad_event(
+            "moved", {"id": ad["id"], "type": ads_type}, ad["previous_type"]
+        )
+        for ad in moved
+    )
+    return moved
+
+
+def _if_match_versions(if_match: str) -> Optional[list[int]]:
+    """Версии из заголовка If-Match, None если подходит любая."""
+    if if_match.strip() == "*":
+        return None
+    versions = []
+    for tag in if_match.split(","):
+        tag = tag.strip()
+        if tag.startswith('"') and tag.endswith('"') and tag[1:-1].isdigit():
+            versions.append(int(tag[1:-1]))
+    return versions
+
+
 @router.put("/{ad_id}/move_ad", responses={
     403: {"description": "You do not have permission to access this resource"},
     404: {"description": "Ad not found"},
+    412: {"description": "Ad was modified"},
     500: {"description": "Internal Server Error"}
 })
 async def move_ad(
     ad_id: int,
     ads_type: AdType,
+    response: Response,
+    if_match: Optional[str] = Header(default=None),
     session: AsyncSession = Depends(get_async_session),
     current_user: User = Depends(current_user)
 ):
@@ -123,18 +409,31 @@ async def move_ad(
                     "details": "You dont have access to this"
                 })
 
-        ad = await session.get(Ad, ad_id)
-        if ad is None:
-            return JSONResponse(status_code=404, content={
+        old_ad = select(Ad.id, Ad.type).where(
+            Ad.id == ad_id, Ad.deleted_at.is_(None)
+        )
+        versions = None if if_match is None else _if_match_versions(if_match)
+        if versions is not None:
+            old_ad = old_ad.where(Ad.version.in_(versions))
+
+        moved = await _move_ads(session, ads_type, old_ad)
+        if not moved:
+            ad = await session.get(Ad, ad_id)
+            if ad is None or ad.deleted_at is not None:
+                return JSONResponse(status_code=404, content={
+                        "status": "error",
+                        "data": None,
+                        "details": "Ad not found"
+                    })
+            return JSONResponse(status_code=412, content={
                     "status": "error",
                     "data": None,
-                    "details": "Ad not found"
-                })
+                    "details": "Ad was modified"
+                }, headers={"ETag": _ad_etag(ad.version)})
 
-        await session.execute(
-            update(Ad).where(Ad.id == ad_id).values(type=ads_type)
-        )
-        await session.commit()
+        ad = dict(moved[0])
+        del ad["previous_type"]
+        response.headers["ETag"] = _ad_etag(ad["version"])
 
         return {
             "status": "success",
@@ -142,6 +441,79 @@ async def move_ad(
             "details": None
         }
 
+    except DatabaseUnavailable:
+        raise
+    except Exception as error:
+        logger.error(f"{error}\n{traceback.format_exc()}")
+        send_message_to_telegram(error)
+        raise HTTPException(status_code=500, detail=CRITICAL_ERROR)
+
+
+@router.put("/move_ads", responses={
+    400: {"description": "Invalid filter"},
+    403: {"description": "You do not have permission to access this resource"},
+    500: {"description": "Internal Server Error"}
+})
+async def move_ads(
+    ads_move: AdsMove,
+    session: AsyncSession = Depends(get_async_session),
+    current_user: User = Depends(current_user)
+):
+    try:
+        if current_user.role != RoleType.admin:
+            return JSONResponse(status_code=403, content={
+                    "status": "error",
+                    "data": None,
+                    "details": "You dont have access to this"
+                })
+
+        if (ads_move.ids is None) == (ads_move.from_type is None):
+            return JSONResponse(status_code=400, content={
+                "status": "error",
+                "data": None,
+                "details": "Pass either ids or from_type"
+            })
+
+        if ads_move.from_type == ads_move.ads_type:
+            return JSONResponse(status_code=400, content={
+                "status": "error",
+                "data": None,
+                "details": "from_type and ads_type must differ"
+            })
+
+        moved = []
+        if ads_move.ids is not None:
+            ids = list(dict.fromkeys(ads_move.ids))
+            for chunk in chunked(ids, BATCH_CHUNK_SIZE):
+                moved += [ad["id"] for ad in await _move_ads(
+                    session, ads_move.ads_type,
+                    select(Ad.id, Ad.type).where(
+                        in_ids(Ad.id, chunk), Ad.deleted_at.is_(None)
+                    )
+                )]
+            moved_ids = set(moved)
+            not_found = [ad_id for ad_id in ids if ad_id not in moved_ids]
+        else:
+            while True:
+                chunk = [ad["id"] for ad in await _move_ads(
+                    session, ads_move.ads_type,
+                    select(Ad.id, Ad.type).where(
+                        Ad.type == ads_move.from_type, Ad.deleted_at.is_(None)
+                    ).limit(BATCH_CHUNK_SIZE)
+                )]
+                moved += chunk
+                if len(chunk) < BATCH_CHUNK_SIZE:
+                    break
+            not_found = []
+
+        return {
+            "status": "success",
+            "data": {"moved": moved, "not_found": not_found},
+            "details": None
+        }
+
+    except DatabaseUnavailable:
+        raise
     except Exception as error:
         logger.error(f"{error}\n{traceback.format_exc()}")
         send_message_to_telegram(error)
@@ -160,7 +532,7 @@ async def delete_ad(
     try:
         ad_to_delete = await session.get(Ad, ad_id)
 
-        if ad_to_delete is None:
+        if ad_to_delete is None or ad_to_delete.deleted_at is not None:
             return JSONResponse(status_code=404, content={
                 "status": "error",
                 "data": None,
@@ -174,9 +546,21 @@ async def delete_ad(
                 "details": "You do not have permission to access this resource"
             })
 
-        await session.delete(ad_to_delete)
+        await session.execute(
+            update(Ad).where(Ad.id == ad_id).values(
+                deleted_at=func.now(), version=Ad.version + 1
+            )
+        )
         await session.commit()
+        await invalidate_ads([ad_id])
+        await publish_ad_event(
+            "deleted", {"id": ad_id, "type": ad_to_delete.type}
+        )
+        await remove_from_timelines(ad_to_delete.user_id, "ad", ad_id)
+        await remove_from_hot_window([ad_id])
 
+    except DatabaseUnavailable:
+        raise
     except Exception as error:
         logger.error(f"{error}\n{traceback.format_exc()}")
         send_message_to_telegram(error)
@@ -196,7 +580,7 @@ async def add_comment(
 ):
     try:
         ad = await session.get(Ad, ad_id)
-        if ad is None:
+        if ad is None or ad.deleted_at is not None:
             return JSONResponse(status_code=404, content={
                     "status": "error",
                     "data": None,
@@ -206,11 +590,20 @@ async def add_comment(
         comment_values = comment_data.model_dump()
         comment_values["user_id"] = current_user.id
         comment_values["ad_id"] = ad_id
-        stmt = insert(Comment).values(**comment_values)
-        await session.execute(stmt)
+        stmt = insert(Comment).values(**comment_values).returning(
+            Comment.id, Comment.created_at
+        )
+        result = await session.execute(stmt)
         await session.commit()
+        comment_values.update(result.mappings().one())
+        await add_to_timelines(
+            current_user.id, "comment", comment_values["id"],
+            comment_values["created_at"]
+        )
         return {"status": "success", "data": comment_values, "details": None}
 
+    except DatabaseUnavailable:
+        raise
     except Exception as error:
         logger.error(f"{error}\n{traceback.format_exc()}")
         send_message_to_telegram(error)
@@ -218,6 +611,7 @@ async def add_comment(
 
 
 @router.get("/{ad_id}/comments", responses={
+    400: {"description": "Unknown fields"},
     404: {"description": "Ad not found"},
     500: {"description": "Internal Server Error"}
 })
@@ -226,17 +620,18 @@ async def get_comments_for_ad(
     ad_id: int, session: AsyncSession = Depends(get_async_session),
     page: int = Query(ge=1, default=1),
     size: int = Query(ge=1, le=100),
+    fields: Optional[list[str]] = Depends(sparse_fields(Comment)),
 ):
     try:
         ad = await session.get(Ad, ad_id)
-        if ad is None:
+        if ad is None or ad.deleted_at is not None:
             return JSONResponse(status_code=404, content={
                     "status": "error",
                     "data": None,
                     "details": "Ad not found"
                 })
 
-        query = select(Comment).where(
+        query = select(*field_columns(Comment, fields)).where(
             Comment.ad_id == ad_id
         ).order_by(
             Comment.created_at.desc()
@@ -250,6 +645,8 @@ async def get_comments_for_ad(
             "size": size,
         }
 
+    except DatabaseUnavailable:
+        raise
     except Exception as error:
         logger.error(f"{error}\n{traceback.format_exc()}")
         send_message_to_telegram(error)
@@ -283,7 +680,10 @@ async def delete_comment(
                 })
         await session.delete(comment)
         await session.commit()
+        await remove_from_timelines(comment.user_id, "comment", comment_id)
 
+    except DatabaseUnavailable:
+        raise
     except Exception as error:
         logger.error(f"{error}\n{traceback.format_exc()}")
         send_message_to_telegram(error)
@@ -304,7 +704,7 @@ async def add_review(
 ):
     try:
         ad = await session.get(Ad, ad_id)
-        if ad is None:
+        if ad is None or ad.deleted_at is not None:
             return JSONResponse(status_code=404, content={
                     "status": "error",
                     "data": None,
@@ -333,15 +733,24 @@ async def add_review(
         review_values = review_data.model_dump()
         review_values["user_id"] = current_user.id
         review_values["ad_id"] = ad_id
-        stmt = insert(Review).values(**review_values)
-        await session.execute(stmt)
+        stmt = insert(Review).values(**review_values).returning(
+            Review.id, Review.created_at
+        )
+        result = await session.execute(stmt)
         await session.commit()
+        review_values.update(result.mappings().one())
+        await add_to_timelines(
+            current_user.id, "review", review_values["id"],
+            review_values["created_at"]
+        )
         return {
             "status": "success",
             "data": review_values,
             "details": None
         }
 
+    except DatabaseUnavailable:
+        raise
     except Exception as error:
         logger.error(f"{error}\n{traceback.format_exc()}")
         send_message_to_telegram(error)
@@ -349,6 +758,7 @@ async def add_review(
 
 
 @router.get("/{ad_id}/reviews", responses={
+    400: {"description": "Unknown fields"},
     404: {"description": "Ad not found"},
     500: {"description": "Internal Server Error"}
 })
@@ -357,17 +767,18 @@ async def get_reviews_for_ad(
     ad_id: int, session: AsyncSession = Depends(get_async_session),
     page: int = Query(ge=1, default=1),
     size: int = Query(ge=1, le=100),
+    fields: Optional[list[str]] = Depends(sparse_fields(Review)),
 ):
     try:
         ad = await session.get(Ad, ad_id)
-        if ad is None:
+        if ad is None or ad.deleted_at is not None:
             return JSONResponse(status_code=404, content={
                     "status": "error",
                     "data": None,
                     "details": "Ad not found"
                 })
 
-        query = select(Review).where(
+        query = select(*field_columns(Review, fields)).where(
             Review.ad_id == ad_id
         ).order_by(
             Review.created_at.desc()
@@ -381,6 +792,8 @@ async def get_reviews_for_ad(
             "size": size,
         }
 
+    except DatabaseUnavailable:
+        raise
     except Exception as error:
         logger.error(f"{error}\n{traceback.format_exc()}")
         send_message_to_telegram(error)
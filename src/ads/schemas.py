@@ -1,4 +1,8 @@
-from pydantic import BaseModel
+from typing import Optional
+
+from pydantic import BaseModel, Field, model_validator
+
+from ads.models import AdType
 
 
 class AdCreate(BaseModel):
@@ -6,6 +10,14 @@ class AdCreate(BaseModel):
     description: str
     price: float
     type: str
+    latitude: Optional[float] = Field(default=None, ge=-90, le=90)
+    longitude: Optional[float] = Field(default=None, ge=-180, le=180)
+
+    @model_validator(mode="after")
+    def check_coordinates(self):
+        if (self.latitude is None) != (self.longitude is None):
+            raise ValueError("Pass both latitude and longitude")
+        return self
 
 
 class CommentCreate(BaseModel):
@@ -15,3 +27,21 @@ class CommentCreate(BaseModel):
 class ReviewCreate(BaseModel):
     text: str
     rating: int
+
+
+class AdsMove(BaseModel):
+    ads_type: AdType
+    ids: Optional[list[int]] = None
+    from_type: Optional[AdType] = None
+
+
+class GeoFilter(BaseModel):
+    lat: float
+    lon: float
+    radius: Optional[float]
+    min_lat: float
+    min_lon: float
+    max_lat: float
+    max_lon: float
+    after_distance: Optional[float]
+    after_id: Optional[int]
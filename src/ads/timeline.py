@@ -0,0 +1,200 @@
+from datetime import datetime
+from typing import Optional
+
+from redis.exceptions import RedisError
+from sqlalchemy import String, literal, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ads.models import Ad, Comment, Review, visible_ads
+from caching import redis_breaker, redis_client
+from config import TIMELINE_EXPIRE, TIMELINE_MAX_SIZE, logger
+from database import in_ids
+
+ACTIVITY_MODELS = {"ad": Ad, "comment": Comment, "review": Review}
+# Служебный элемент с наименьшим счетом: его наличие означает, что
+# лента уже заполнена из базы, а не состоит из одних новых записей.
+# Счет -1: в ленте все записи пользователя, 0: лента обрезана
+# до TIMELINE_MAX_SIZE и за ней есть записи в базе.
+TIMELINE_BUILT = "built"
+COMPLETE, TRUNCATED = -1, 0
+
+
+def ads_timeline_key(user_id: int) -> str:
+    return f"user:{user_id}:ads"
+
+
+def activity_timeline_key(user_id: int) -> str:
+    return f"user:{user_id}:activity"
+
+
+def _timeline_keys(user_id: int, kind: str) -> list[str]:
+    keys = [activity_timeline_key(user_id)]
+    if kind == "ad":
+        keys.append(ads_timeline_key(user_id))
+    return keys
+
+
+async def add_to_timelines(
+    user_id: int, kind: str, item_id: int, created_at: datetime
+):
+    """Добавляет объявление, комментарий или отзыв в ленты автора."""
+    member = {f"{kind}:{item_id}": created_at.timestamp()}
+    keys = _timeline_keys(user_id, kind)
+    try:
+        async with redis_breaker:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.zadd(key, member)
+                    pipe.zremrangebyrank(key, 1, -TIMELINE_MAX_SIZE - 1)
+                    pipe.expire(key, TIMELINE_EXPIRE)
+                replies = await pipe.execute()
+            # Если ленту пришлось обрезать, за ней в базе есть еще записи.
+            trimmed = [
+                key for key, removed in zip(keys, replies[1::3]) if removed
+            ]
+            for key in trimmed:
+                await redis_client.zadd(
+                    key, {TIMELINE_BUILT: TRUNCATED}, xx=True
+                )
+    except RedisError as error:
+        logger.warning(f"Не удалось обновить ленту пользователя: {error}")
+
+
+async def remove_from_timelines(user_id: int, kind: str, item_id: int):
+    try:
+        async with redis_breaker:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for key in _timeline_keys(user_id, kind):
+                    pipe.zrem(key, f"{kind}:{item_id}")
+                await pipe.execute()
+    except RedisError as error:
+        logger.warning(f"Не удалось обновить ленту пользователя: {error}")
+
+
+def _parse_member(member: str) -> tuple[str, int]:
+    kind, item_id = member.split(":")
+    return kind, int(item_id)
+
+
+async def _read_timeline(
+    key: str, start: int, stop: int
+) -> tuple[Optional[float], int, list[tuple[str, int]]]:
+    """Служебная отметка ленты, число элементов и страница из Redis."""
+    async with redis_breaker:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            built, count, members, _ = await pipe.zscore(
+                key, TIMELINE_BUILT
+            ).zcard(key).zrevrange(key, start, stop).expire(
+                key, TIMELINE_EXPIRE
+            ).execute()
+    return built, count, [
+        _parse_member(member) for member in members
+        if member != TIMELINE_BUILT
+    ]
+
+
+async def _load_refs(
+    session: AsyncSession, user_id: int, kinds: list[str],
+    limit: int, offset: int = 0
+) -> list[tuple[str, int, datetime]]:
+    """Новейшие записи пользователя по индексам (user_id, created_at)."""
+    branches = []
+    for kind in kinds:
+        model = ACTIVITY_MODELS[kind]
+        branch = select(
+            literal(kind, String).label("kind"), model.id, model.created_at
+        ).where(model.user_id == user_id)
+        if model is Ad:
+            branch = branch.where(Ad.deleted_at.is_(None))
+        branch = branch.order_by(model.created_at.desc()).limit(
+            offset + limit
+        ).subquery()
+        branches.append(select(branch))
+
+    refs = union_all(*branches).subquery()
+    result = await session.execute(
+        select(refs).order_by(
+            refs.c.created_at.desc(), refs.c.id.desc()
+        ).limit(limit).offset(offset)
+    )
+    return [tuple(row) for row in result.all()]
+
+
+async def _store_timeline(key: str, refs: list[tuple[str, int, datetime]]):
+    members = {
+        f"{kind}:{item_id}": created_at.timestamp()
+        for kind, item_id, created_at in refs
+    }
+    members[TIMELINE_BUILT] = (
+        COMPLETE if len(refs) < TIMELINE_MAX_SIZE else TRUNCATED
+    )
+    try:
+        async with redis_breaker:
+            async with redis_client.pipeline(transaction=True) as pipe:
+                pipe.zadd(key, members)
+                pipe.zremrangebyrank(key, 1, -TIMELINE_MAX_SIZE - 1)
+                pipe.expire(key, TIMELINE_EXPIRE)
+                await pipe.execute()
+    except RedisError as error:
+        logger.warning(f"Не удалось сохранить ленту пользователя: {error}")
+
+
+async def _hydrate(
+    session: AsyncSession, refs: list[tuple[str, int]]
+) -> list[tuple[str, object]]:
+    ids = {}
+    for kind, item_id in refs:
+        ids.setdefault(kind, []).append(item_id)
+
+    items = {}
+    for kind, kind_ids in ids.items():
+        model = ACTIVITY_MODELS[kind]
+        query = select(model).where(in_ids(model.id, kind_ids))
+        if model is Ad:
+            query = query.where(visible_ads())
+        for item in (await session.execute(query)).scalars():
+            items[kind, item.id] = item
+
+    return [(kind, items[kind, item_id]) for kind, item_id in refs
+            if (kind, item_id) in items]
+
+
+async def get_timeline(
+    session: AsyncSession, user_id: int, kinds: list[str],
+    page: int, size: int
+) -> list[tuple[str, object]]:
+    """
+    Страница ленты пользователя: id берутся из Redis, записи - из базы
+    по первичному ключу. Лента хранит TIMELINE_MAX_SIZE новейших записей,
+    более старые страницы читаются из базы. После удалений в обрезанной
+    ленте меньше записей, страницы за ее концом тоже читаются из базы.
+    Удаленные и скрытые записи пропускаются, поэтому страница может
+    быть короче size.
+    """
+    key = (
+        ads_timeline_key(user_id) if kinds == ["ad"]
+        else activity_timeline_key(user_id)
+    )
+    start = (page - 1) * size
+    stop = start + size - 1
+    page_refs = None
+    if stop < TIMELINE_MAX_SIZE:
+        try:
+            built, count, page_refs = await _read_timeline(key, start, stop)
+        except RedisError:
+            pass
+        else:
+            if built is None:
+                refs = await _load_refs(
+                    session, user_id, kinds, TIMELINE_MAX_SIZE
+                )
+                await _store_timeline(key, refs)
+                page_refs = [ref[:2] for ref in refs[start:stop + 1]]
+            # Последний элемент ленты - служебный, он не входит в count.
+            elif stop >= count - 1 and built != COMPLETE:
+                page_refs = None
+
+    if page_refs is None:
+        refs = await _load_refs(session, user_id, kinds, size, start)
+        page_refs = [ref[:2] for ref in refs]
+    return await _hydrate(session, page_refs)
@@ -6,9 +6,8 @@ from sqlalchemy import (
     Column, Integer, String, TIMESTAMP,
     Enum, Boolean
 )
-from sqlalchemy.orm import declarative_base
 
-base = declarative_base()
+from database import base
 
 
 class RoleType(str, PythonEnum):
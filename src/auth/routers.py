@@ -5,11 +5,15 @@ from fastapi.responses import JSONResponse
 from sqlalchemy import update
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from ads.timeline import ACTIVITY_MODELS, get_timeline
 from auth.base_config import current_user
 from auth.models import User, RoleType
+from auth.schemas import UsersUpdate
 from constants import CRITICAL_ERROR
-from config import logger
-from database import get_async_session
+from config import BATCH_CHUNK_SIZE, logger
+from database import (
+    DatabaseUnavailable, chunked, get_async_session, in_ids
+)
 from telegram_bot import send_message_to_telegram
 
 
@@ -19,6 +23,55 @@ router = APIRouter(
 )
 
 
+@router.put("/change_role_or_active", status_code=200, responses={
+    403: {"description": "Access forbidden for this role"},
+    500: {"description": "Internal Server Error"}
+})
+async def change_users_role(
+    users_update: UsersUpdate,
+    current_user: User = Depends(current_user),
+    session: AsyncSession = Depends(get_async_session)
+):
+    try:
+        if current_user.role != RoleType.admin:
+            return JSONResponse(status_code=403, content={
+                    "status": "error",
+                    "data": None,
+                    "details": "You dont have access to this"
+                })
+
+        ids = list(dict.fromkeys(users_update.ids))
+        updated = []
+        for chunk in chunked(ids, BATCH_CHUNK_SIZE):
+            result = await session.execute(
+                update(User).where(in_ids(User.id, chunk)).values(
+                    role=users_update.value_role,
+                    is_active=bool(users_update.value_active)
+                ).returning(User.id)
+            )
+            updated += result.scalars().all()
+            await session.commit()
+
+        updated_ids = set(updated)
+        return {
+            "status": "success",
+            "data": {
+                "updated": updated,
+                "not_found": [
+                    user_id for user_id in ids if user_id not in updated_ids
+                ],
+            },
+            "details": None
+        }
+
+    except DatabaseUnavailable:
+        raise
+    except Exception as error:
+        logger.error(f"{error}\n{traceback.format_exc()}")
+        send_message_to_telegram(error)
+        raise HTTPException(status_code=500, detail=CRITICAL_ERROR)
+
+
 @router.put("/{user_id}/change_role_or_active", status_code=200, responses={
     403: {"description": "Access forbidden for this role"},
     404: {"description": "User not found"},
@@ -60,6 +113,92 @@ async def change_user_role(
             "details": None
         }
 
+    except DatabaseUnavailable:
+        raise
+    except Exception as error:
+        logger.error(f"{error}\n{traceback.format_exc()}")
+        send_message_to_telegram(error)
+        raise HTTPException(status_code=500, detail=CRITICAL_ERROR)
+
+
+async def _user_timeline(
+    session: AsyncSession, user_id: int, kinds: list[str],
+    page: int, size: int
+):
+    if await session.get(User, user_id) is None:
+        return None
+    return await get_timeline(session, user_id, kinds, page, size)
+
+
+@router.get("/{user_id}/ads", responses={
+    404: {"description": "User not found"},
+    500: {"description": "Internal Server Error"}
+})
+async def get_user_ads(
+    user_id: int,
+    page: int = Query(ge=1, default=1),
+    size: int = Query(ge=1, le=100, default=20),
+    session: AsyncSession = Depends(get_async_session)
+):
+    try:
+        timeline = await _user_timeline(session, user_id, ["ad"], page, size)
+        if timeline is None:
+            return JSONResponse(status_code=404, content={
+                    "status": "error",
+                    "data": None,
+                    "details": "User not found"
+                })
+
+        return {
+            "status": "success",
+            "data": [ad for _, ad in timeline],
+            "details": None,
+            "page": page,
+            "size": size,
+        }
+
+    except DatabaseUnavailable:
+        raise
+    except Exception as error:
+        logger.error(f"{error}\n{traceback.format_exc()}")
+        send_message_to_telegram(error)
+        raise HTTPException(status_code=500, detail=CRITICAL_ERROR)
+
+
+@router.get("/{user_id}/activity", responses={
+    404: {"description": "User not found"},
+    500: {"description": "Internal Server Error"}
+})
+async def get_user_activity(
+    user_id: int,
+    page: int = Query(ge=1, default=1),
+    size: int = Query(ge=1, le=100, default=20),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """Объявления, комментарии и отзывы пользователя, новые первыми."""
+    try:
+        timeline = await _user_timeline(
+            session, user_id, list(ACTIVITY_MODELS), page, size
+        )
+        if timeline is None:
+            return JSONResponse(status_code=404, content={
+                    "status": "error",
+                    "data": None,
+                    "details": "User not found"
+                })
+
+        return {
+            "status": "success",
+            "data": [
+                {"kind": kind, "item": item} for kind, item in timeline
+            ],
+            "details": None,
+            "page": page,
+            "size": size,
+        }
+
+    except DatabaseUnavailable:
+        raise
     except Exception as error:
         logger.error(f"{error}\n{traceback.format_exc()}")
         send_message_to_telegram(error)
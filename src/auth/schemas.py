@@ -1,6 +1,9 @@
 from typing import Optional
 
 from fastapi_users import schemas
+from pydantic import BaseModel, Field
+
+from auth.models import RoleType
 
 
 class UserRead(schemas.BaseUser[int]):
@@ -23,3 +26,9 @@ class UserCreate(schemas.BaseUserCreate):
     is_active: Optional[bool] = True
     is_superuser: Optional[bool] = False
     is_verified: Optional[bool] = False
+
+
+class UsersUpdate(BaseModel):
+    ids: list[int]
+    value_role: RoleType
+    value_active: int = Field(ge=0, le=1, default=1)
@@ -0,0 +1,247 @@
+from contextvars import ContextVar
+from typing import Callable, Iterable, Optional
+
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.redis import RedisBackend
+from fastapi_cache.coder import JsonCoder
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.datastructures import MutableHeaders
+from starlette.requests import Request
+from starlette.responses import Response
+
+from auth.models import User
+from circuit_breaker import CircuitBreaker, ServiceUnavailable
+from config import (
+    REDIS_HOST, REDIS_PORT, REDIS_TIMEOUT, STALE_CACHE_EXPIRE, logger
+)
+from database import db_breaker
+
+AD_DETAIL_NAMESPACE = "ad_detail"
+AD_LIST_NAMESPACE = "ad_list"
+# Копии страниц с geo и fields не хранятся: их ключей неограниченно много.
+STALE_NAMESPACES = (AD_DETAIL_NAMESPACE, AD_LIST_NAMESPACE)
+STALE_EXCLUDED_PARAMS = ("geo", "fields")
+AD_DETAIL_EXPIRE = 30
+STALE_HEADER = "X-Cache-Stale"
+
+redis_client = aioredis.from_url(
+    f"redis://{REDIS_HOST}:{REDIS_PORT}",
+    encoding="utf8", decode_responses=True,
+    socket_timeout=REDIS_TIMEOUT, socket_connect_timeout=REDIS_TIMEOUT
+)
+# Подписка на ленту ждет сообщений сколько угодно долго,
+# поэтому у ее клиента нет таймаута чтения.
+pubsub_client = aioredis.from_url(
+    f"redis://{REDIS_HOST}:{REDIS_PORT}",
+    encoding="utf8", decode_responses=True,
+    socket_connect_timeout=REDIS_TIMEOUT
+)
+
+
+class RedisUnavailable(ServiceUnavailable, RedisError):
+    pass
+
+
+redis_breaker = CircuitBreaker(
+    "Redis", failures=(RedisError,), error=RedisUnavailable
+)
+
+_stale_response: ContextVar[Optional[dict]] = ContextVar(
+    "stale_response", default=None
+)
+
+
+def stale_key(key: str) -> str:
+    return f"stale:{key}"
+
+
+def _keeps_stale_copy(key: str) -> bool:
+    prefix = FastAPICache.get_prefix()
+    for namespace in STALE_NAMESPACES:
+        if key.startswith(f"{prefix}:{namespace}:"):
+            params = key[len(f"{prefix}:{namespace}:"):].split("&")
+            return not any(
+                param.split("=", 1)[0] in STALE_EXCLUDED_PARAMS
+                for param in params
+            )
+    return False
+
+
+class CacheBackend(RedisBackend):
+    """
+    Не обращается к Redis, пока он недоступен: запросы идут мимо кеша.
+    Списки и объявления (STALE_NAMESPACES) дополнительно хранятся
+    STALE_CACHE_EXPIRE секунд, эта копия отдается, пока недоступна
+    база данных.
+    """
+
+    async def get_with_ttl(self, key: str) -> tuple[int, Optional[str]]:
+        try:
+            async with redis_breaker:
+                ttl, value = await super().get_with_ttl(key)
+                if value is None and db_breaker.is_open:
+                    value = await self.redis.get(stale_key(key))
+                    if value is not None:
+                        _mark_stale()
+                        # TTL отсутствующего свежего ключа равен -2.
+                        ttl = 0
+                return ttl, value
+        except RedisError:
+            return 0, None
+
+    async def set(
+        self, key: str, value: Optional[str], expire: Optional[int] = None
+    ):
+        if value is None:
+            return
+        try:
+            async with redis_breaker:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    pipe.set(key, value, ex=expire)
+                    if _keeps_stale_copy(key):
+                        pipe.set(
+                            stale_key(key), value, ex=STALE_CACHE_EXPIRE
+                        )
+                    await pipe.execute()
+        except RedisError:
+            pass
+
+
+class CacheCoder(JsonCoder):
+    """
+    Обработчики возвращают JSONResponse только для ошибок (403, 404),
+    такие ответы не кешируются: иначе повторный запрос получил бы
+    тело ошибки со статусом 200.
+    """
+
+    @classmethod
+    def encode(cls, value) -> Optional[str]:
+        if isinstance(value, Response):
+            return None
+        return super().encode(value)
+
+
+def _mark_stale():
+    stale_response = _stale_response.get()
+    if stale_response is not None:
+        stale_response["stale"] = True
+
+
+class StaleCacheMiddleware:
+    """
+    Помечает заголовком ответы, отданные из устаревшей копии кеша,
+    и запрещает клиентам и прокси их кешировать и перепроверять.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stale_response = {"stale": False}
+        token = _stale_response.set(stale_response)
+
+        async def send_with_marker(message):
+            if message["type"] == "http.response.start" and (
+                stale_response["stale"]
+            ):
+                headers = MutableHeaders(scope=message)
+                headers[STALE_HEADER] = "1"
+                headers["Cache-Control"] = "no-store"
+                del headers["ETag"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_marker)
+        finally:
+            _stale_response.reset(token)
+
+
+def build_cache_key(namespace: str, **params) -> str:
+    values = "&".join(
+        f"{name}={getattr(value, 'value', value)}"
+        for name, value in sorted(params.items())
+    )
+    return f"{FastAPICache.get_prefix()}:{namespace}:{values}"
+
+
+def key_builder(
+    func: Callable,
+    namespace: Optional[str] = "",
+    request: Optional[Request] = None,
+    response: Optional[Response] = None,
+    args: Optional[tuple] = None,
+    kwargs: Optional[dict] = None,
+) -> str:
+    """
+    Строит ключ только из параметров запроса, чтобы он был одинаковым
+    для всех сессий и совпадал с ключом при прогреве кеша.
+    """
+    params = {}
+    for name, value in (kwargs or {}).items():
+        if value is None or isinstance(value, AsyncSession):
+            continue
+        if isinstance(value, User):
+            value = value.id
+        params[name] = value
+
+    return build_cache_key(
+        namespace or f"{func.__module__}:{func.__name__}", **params
+    )
+
+
+def ad_cache_key(ad_id: int) -> str:
+    return build_cache_key(AD_DETAIL_NAMESPACE, ad_id=ad_id)
+
+
+async def get_cached_ads(ad_ids: list[int]) -> dict[int, dict]:
+    """Объявления из кеша детального просмотра, одним MGET."""
+    try:
+        async with redis_breaker:
+            values = await redis_client.mget(
+                [ad_cache_key(ad_id) for ad_id in ad_ids]
+            )
+    except RedisError:
+        return {}
+
+    cached = {}
+    for ad_id, value in zip(ad_ids, values):
+        if value is None:
+            continue
+        data = JsonCoder.decode(value).get("data")
+        if data is not None:
+            cached[ad_id] = data
+    return cached
+
+
+async def cache_ads(ads: Iterable):
+    """Записывает объявления в кеш в том же виде, что и get_detail_ad."""
+    try:
+        async with redis_breaker:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for ad in ads:
+                    pipe.set(ad_cache_key(ad.id), JsonCoder.encode({
+                        "status": "success",
+                        "data": ad,
+                        "details": None
+                    }), ex=AD_DETAIL_EXPIRE)
+                await pipe.execute()
+    except RedisError:
+        pass
+
+
+async def invalidate_ads(ad_ids: Iterable[int]):
+    keys = []
+    for ad_id in ad_ids:
+        keys += [ad_cache_key(ad_id), stale_key(ad_cache_key(ad_id))]
+    if not keys:
+        return
+    try:
+        async with redis_breaker:
+            await redis_client.delete(*keys)
+    except RedisError as error:
+        logger.warning(f"Не удалось сбросить кеш объявлений: {error}")
@@ -0,0 +1,86 @@
+import math
+import time
+
+from config import (
+    BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_TIMEOUT, logger
+)
+
+
+class ServiceUnavailable(Exception):
+    def __init__(self, service: str, retry_after: int):
+        super().__init__(f"{service} недоступен")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    После BREAKER_FAILURE_THRESHOLD ошибок подряд перестает обращаться
+    к сервису на BREAKER_RESET_TIMEOUT секунд и сразу поднимает error.
+    Затем пропускает один пробный вызов: успех закрывает предохранитель,
+    ошибка снова открывает его.
+
+        async with breaker:
+            await call()
+
+    Ошибки из failures внутри блока заменяются на error.
+    """
+
+    def __init__(self, name: str, failures: tuple, error=ServiceUnavailable):
+        self.name = name
+        self.failures = failures
+        self.error = error
+        self._failures = 0
+        self._opened_at = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    @property
+    def retry_after(self) -> int:
+        if self._opened_at is None:
+            return 1
+        elapsed = time.monotonic() - self._opened_at
+        return max(1, math.ceil(BREAKER_RESET_TIMEOUT - elapsed))
+
+    def allow(self) -> bool:
+        if self._opened_at is None:
+            return True
+        now = time.monotonic()
+        if now - self._opened_at < BREAKER_RESET_TIMEOUT:
+            return False
+        self._opened_at = now
+        return True
+
+    def record_success(self):
+        if self._opened_at is not None:
+            logger.info(f"{self.name} снова доступен")
+        self._failures = 0
+        self._opened_at = None
+
+    def record_failure(self):
+        self._failures += 1
+        if self._opened_at is None:
+            if self._failures < BREAKER_FAILURE_THRESHOLD:
+                return
+            logger.warning(
+                f"{self.name} недоступен, запросы к нему приостановлены "
+                f"на {BREAKER_RESET_TIMEOUT} с"
+            )
+        self._opened_at = time.monotonic()
+
+    def unavailable(self) -> Exception:
+        return self.error(self.name, self.retry_after)
+
+    async def __aenter__(self):
+        if not self.allow():
+            raise self.unavailable()
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.record_success()
+        elif issubclass(exc_type, self.failures):
+            self.record_failure()
+            raise self.unavailable() from exc
+        return False
@@ -1,20 +1,32 @@
 from sqlalchemy import (
     Column, Integer, String, DateTime,
-    func, ForeignKey
+    func, ForeignKey, Index
 )
-from sqlalchemy.orm import declarative_base
 
-from ads.models import Ad
 from auth.models import User
-
-base = declarative_base()
+from database import base
 
 
 class Complaint(base):
     __tablename__ = "complaint"
 
     id = Column(Integer, primary_key=True, index=True)
-    for_ad = Column(Integer, ForeignKey(Ad.id))
+    for_ad = Column(Integer, index=True)
     author = Column(Integer, ForeignKey(User.id))
     text = Column(String)
     created_at = Column(DateTime(timezone=True), default=func.now())
+
+
+class AdComplaintStats(base):
+    __tablename__ = "ad_complaint_stats"
+
+    ad_id = Column(Integer, primary_key=True)
+    complaints_count = Column(Integer, nullable=False, default=0)
+    last_complaint_at = Column(DateTime(timezone=True))
+
+    __table_args__ = (
+        Index(
+            "ix_ad_complaint_stats_count_ad_id",
+            complaints_count.desc(), ad_id.desc()
+        ),
+    )
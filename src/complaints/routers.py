@@ -1,19 +1,24 @@
 import traceback
+from typing import Optional
 
 from fastapi import APIRouter, HTTPException, Depends, Query
 from fastapi.responses import JSONResponse
 from fastapi_cache.decorator import cache
-from sqlalchemy import select, insert, and_
+from sqlalchemy import select, insert, update, and_, func, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from auth.base_config import current_user
-from auth.models import User
+from auth.models import RoleType, User
+from ads.feed import publish_ad_event
+from ads.hot_window import remove_from_hot_window, update_hot_window
 from ads.models import Ad
-from complaints.models import Complaint
+from caching import invalidate_ads
+from complaints.models import AdComplaintStats, Complaint
 from complaints.schemas import ComplaintCreate
 from constants import CRITICAL_ERROR
-from config import logger
-from database import get_async_session
+from config import COMPLAINTS_HIDE_THRESHOLD, logger
+from database import DatabaseUnavailable, get_async_session
 from telegram_bot import send_message_to_telegram
 
 router = APIRouter(
@@ -53,6 +58,114 @@ async def get_list_complaints(
             "size": size,
         }
 
+    except DatabaseUnavailable:
+        raise
+    except Exception as error:
+        logger.error(f"{error}\n{traceback.format_exc()}")
+        send_message_to_telegram(error)
+        raise HTTPException(status_code=500, detail=CRITICAL_ERROR)
+
+
+@router.get("/moderation", responses={
+    403: {"description": "Access forbidden for this role"},
+    500: {"description": "Internal Server Error"}
+})
+async def get_moderation_queue(
+    size: int = Query(ge=1, le=100, default=20),
+    after_count: Optional[int] = None,
+    after_ad_id: Optional[int] = None,
+    current_user: User = Depends(current_user),
+    session: AsyncSession = Depends(get_async_session)
+):
+    try:
+        if current_user.role != RoleType.admin:
+            return JSONResponse(status_code=403, content={
+                    "status": "error",
+                    "data": None,
+                    "details": "You dont have access to this"
+                })
+
+        query = select(
+            AdComplaintStats.ad_id,
+            AdComplaintStats.complaints_count,
+            AdComplaintStats.last_complaint_at,
+            Ad.title,
+            Ad.hidden_at,
+        ).join(Ad, Ad.id == AdComplaintStats.ad_id).where(
+            Ad.deleted_at.is_(None)
+        ).order_by(
+            AdComplaintStats.complaints_count.desc(),
+            AdComplaintStats.ad_id.desc()
+        ).limit(size)
+        if after_count is not None and after_ad_id is not None:
+            query = query.where(tuple_(
+                AdComplaintStats.complaints_count, AdComplaintStats.ad_id
+            ) < tuple_(after_count, after_ad_id))
+        result = (await session.execute(query)).mappings().all()
+
+        next_page = None
+        if len(result) == size:
+            next_page = {
+                "after_count": result[-1]["complaints_count"],
+                "after_ad_id": result[-1]["ad_id"],
+            }
+        return {
+            "status": "success",
+            "data": result,
+            "details": None,
+            "size": size,
+            "next": next_page,
+        }
+
+    except DatabaseUnavailable:
+        raise
+    except Exception as error:
+        logger.error(f"{error}\n{traceback.format_exc()}")
+        send_message_to_telegram(error)
+        raise HTTPException(status_code=500, detail=CRITICAL_ERROR)
+
+
+@router.put("/moderation/{ad_id}/unhide", responses={
+    403: {"description": "Access forbidden for this role"},
+    404: {"description": "Ad not found"},
+    500: {"description": "Internal Server Error"}
+})
+async def unhide_ad(
+    ad_id: int,
+    current_user: User = Depends(current_user),
+    session: AsyncSession = Depends(get_async_session)
+):
+    try:
+        if current_user.role != RoleType.admin:
+            return JSONResponse(status_code=403, content={
+                    "status": "error",
+                    "data": None,
+                    "details": "You dont have access to this"
+                })
+
+        result = await session.execute(
+            update(Ad).where(
+                Ad.id == ad_id, Ad.deleted_at.is_(None)
+            ).values(
+                hidden_at=None, version=Ad.version + 1
+            ).returning(*Ad.__table__.columns)
+        )
+        ad = result.mappings().one_or_none()
+        if ad is None:
+            return JSONResponse(status_code=404, content={
+                    "status": "error",
+                    "data": None,
+                    "details": "Ad not found"
+                })
+        await session.commit()
+        await invalidate_ads([ad_id])
+        await update_hot_window([ad])
+        await publish_ad_event("unhidden", dict(ad))
+
+        return {"status": "success", "data": {"id": ad_id}, "details": None}
+
+    except DatabaseUnavailable:
+        raise
     except Exception as error:
         logger.error(f"{error}\n{traceback.format_exc()}")
         send_message_to_telegram(error)
@@ -73,7 +186,7 @@ async def add_complaint(
 ):
     try:
         ad = await session.get(Ad, ad_id)
-        if ad is None:
+        if ad is None or ad.deleted_at is not None:
             return JSONResponse(status_code=404, content={
                     "status": "error",
                     "data": None,
@@ -97,9 +210,35 @@ async def add_complaint(
         complaint_values["author"] = current_user.id
         stmt = insert(Complaint).values(**complaint_values)
         await session.execute(stmt)
+
+        stmt = pg_insert(AdComplaintStats).values(
+            ad_id=ad_id, complaints_count=1, last_complaint_at=func.now()
+        ).on_conflict_do_update(
+            index_elements=[AdComplaintStats.ad_id],
+            set_={
+                "complaints_count": AdComplaintStats.complaints_count + 1,
+                "last_complaint_at": func.now(),
+            }
+        ).returning(AdComplaintStats.complaints_count)
+        complaints_count = (await session.execute(stmt)).scalar_one()
+
+        hide_ad = complaints_count == COMPLAINTS_HIDE_THRESHOLD
+        if hide_ad:
+            await session.execute(
+                update(Ad).where(Ad.id == ad_id).values(
+                    hidden_at=func.now(), version=Ad.version + 1
+                )
+            )
         await session.commit()
+
+        if hide_ad:
+            await invalidate_ads([ad_id])
+            await remove_from_hot_window([ad_id])
+            await publish_ad_event("hidden", {"id": ad_id, "type": ad.type})
         return {"status": "success", "data": complaint_values, "details": None}
 
+    except DatabaseUnavailable:
+        raise
     except Exception as error:
         logger.error(f"{error}\n{traceback.format_exc()}")
         send_message_to_telegram(error)
@@ -0,0 +1,125 @@
+import gzip
+import hashlib
+from collections import OrderedDict
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from config import COMPRESSION_CACHE_SIZE, COMPRESSION_MIN_SIZE
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ENCODERS = {"gzip": lambda body: gzip.compress(body, compresslevel=6)}
+if brotli is not None:
+    ENCODERS = {
+        "br": lambda body: brotli.compress(body, quality=5),
+        **ENCODERS,
+    }
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Лучшее из поддерживаемых сжатий по заголовку Accept-Encoding."""
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+
+    best, best_quality = None, 0.0
+    for encoding in ENCODERS:
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+class CompressedBodies:
+    """
+    Сжатые тела ответов по хешу исходного тела. Ответы из кеша
+    повторяются байт в байт, поэтому их не приходится сжимать заново.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._size = 0
+        self._bodies = OrderedDict()
+
+    def compress(self, body: bytes, encoding: str) -> bytes:
+        key = (encoding, hashlib.blake2b(body, digest_size=16).digest())
+        compressed = self._bodies.get(key)
+        if compressed is not None:
+            self._bodies.move_to_end(key)
+            return compressed
+
+        compressed = ENCODERS[encoding](body)
+        self._bodies[key] = compressed
+        self._size += len(compressed)
+        while self._size > self.max_size:
+            _, evicted = self._bodies.popitem(last=False)
+            self._size -= len(evicted)
+        return compressed
+
+
+class CompressionMiddleware:
+    """
+    Сжимает ответы длиннее COMPRESSION_MIN_SIZE байт. Потоковые ответы
+    (в том числе лента Server-Sent Events) отправляются как есть.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.bodies = CompressedBodies(COMPRESSION_CACHE_SIZE)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        encoding = choose_encoding(
+            Headers(scope=scope).get("accept-encoding", "")
+        )
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start = None
+
+        async def send_compressed(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if "content-encoding" in headers or headers.get(
+                    "content-type", ""
+                ).startswith("text/event-stream"):
+                    await send(message)
+                else:
+                    start = message
+                return
+
+            if start is None:
+                await send(message)
+                return
+
+            response_start, start = start, None
+            body = message.get("body", b"")
+            if message.get("more_body") or len(body) < COMPRESSION_MIN_SIZE:
+                await send(response_start)
+                await send(message)
+                return
+
+            compressed = self.bodies.compress(body, encoding)
+            headers = MutableHeaders(scope=response_start)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+            await send(response_start)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
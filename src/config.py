@@ -1,9 +1,10 @@
 import os
-import sys
 import logging
 
 from dotenv import load_dotenv
 
+from log_config import setup_logging
+
 load_dotenv()
 
 DB_HOST = os.getenv("DB_HOST")
@@ -20,13 +21,76 @@ SECRET_AUTH = os.getenv("SECRET_AUTH")
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
 
-logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    level=logging.INFO,
-    handlers=(
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler("logfile.log", encoding="utf-8"),
-    )
+CACHE_WARMUP_PAGES = int(os.getenv("CACHE_WARMUP_PAGES", 3))
+CACHE_WARMUP_SIZES = [
+    int(size) for size in os.getenv("CACHE_WARMUP_SIZES", "10,20").split(",")
+]
+CACHE_WARMUP_TOP_ADS = int(os.getenv("CACHE_WARMUP_TOP_ADS", 100))
+CACHE_WARMUP_TIMEOUT = int(os.getenv("CACHE_WARMUP_TIMEOUT", 20))
+ACCESS_LOG_SAMPLE_RATE = float(os.getenv("ACCESS_LOG_SAMPLE_RATE", 0.01))
+
+VIEWS_FLUSH_INTERVAL = int(os.getenv("VIEWS_FLUSH_INTERVAL", 60))
+TRENDING_HALF_LIFE = int(os.getenv("TRENDING_HALF_LIFE", 6 * 60 * 60))
+TRENDING_MAX_SIZE = int(os.getenv("TRENDING_MAX_SIZE", 1000))
+
+PURGE_INTERVAL = int(os.getenv("PURGE_INTERVAL", 60))
+PURGE_BATCH_SIZE = int(os.getenv("PURGE_BATCH_SIZE", 500))
+PURGE_MAX_BATCHES = int(os.getenv("PURGE_MAX_BATCHES", 20))
+
+PARTITIONS_AHEAD = int(os.getenv("PARTITIONS_AHEAD", 3))
+ARCHIVE_AFTER_MONTHS = int(os.getenv("ARCHIVE_AFTER_MONTHS", 12))
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+
+FEED_BUFFER_SIZE = int(os.getenv("FEED_BUFFER_SIZE", 100))
+FEED_HEARTBEAT = int(os.getenv("FEED_HEARTBEAT", 15))
+FEED_MAX_SUBSCRIBERS = int(os.getenv("FEED_MAX_SUBSCRIBERS", 10000))
+
+COMPLAINTS_HIDE_THRESHOLD = int(os.getenv("COMPLAINTS_HIDE_THRESHOLD", 10))
+
+BATCH_CHUNK_SIZE = int(os.getenv("BATCH_CHUNK_SIZE", 1000))
+
+REDIS_TIMEOUT = float(os.getenv("REDIS_TIMEOUT", 0.5))
+DB_CONNECT_TIMEOUT = float(os.getenv("DB_CONNECT_TIMEOUT", 3))
+DB_COMMAND_TIMEOUT = float(os.getenv("DB_COMMAND_TIMEOUT", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 5))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", 5))
+BREAKER_RESET_TIMEOUT = int(os.getenv("BREAKER_RESET_TIMEOUT", 10))
+STALE_CACHE_EXPIRE = int(os.getenv("STALE_CACHE_EXPIRE", 24 * 60 * 60))
+TELEGRAM_MAX_PENDING = int(os.getenv("TELEGRAM_MAX_PENDING", 10))
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", 500))
+COMPRESSION_CACHE_SIZE = int(
+    os.getenv("COMPRESSION_CACHE_SIZE", 32 * 1024 * 1024)
+)
+
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", 24 * 60 * 60))
+IDEMPOTENCY_LOCK_TIMEOUT = int(os.getenv("IDEMPOTENCY_LOCK_TIMEOUT", 30))
+IDEMPOTENCY_WAIT_TIMEOUT = int(os.getenv("IDEMPOTENCY_WAIT_TIMEOUT", 10))
+
+TIMELINE_MAX_SIZE = int(os.getenv("TIMELINE_MAX_SIZE", 1000))
+TIMELINE_EXPIRE = int(os.getenv("TIMELINE_EXPIRE", 7 * 24 * 60 * 60))
+
+SQL_PROFILING = bool(int(os.getenv("SQL_PROFILING", 0)))
+SQL_PROFILING_SLOW_QUERIES = int(os.getenv("SQL_PROFILING_SLOW_QUERIES", 50))
+SQL_PROFILING_N_PLUS_ONE = int(os.getenv("SQL_PROFILING_N_PLUS_ONE", 10))
+
+HOT_WINDOW_SIZE = int(os.getenv("HOT_WINDOW_SIZE", 300))
+HOT_WINDOW_EXPIRE = int(os.getenv("HOT_WINDOW_EXPIRE", 10 * 60))
+
+LOG_FILE = os.getenv("LOG_FILE", "logfile.log")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", 5))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+LOG_ERROR_SAMPLE_WINDOW = int(os.getenv("LOG_ERROR_SAMPLE_WINDOW", 60))
+LOG_ERROR_SAMPLE_BURST = int(os.getenv("LOG_ERROR_SAMPLE_BURST", 5))
+
+setup_logging(
+    filename=LOG_FILE,
+    max_bytes=LOG_MAX_BYTES,
+    backup_count=LOG_BACKUP_COUNT,
+    queue_size=LOG_QUEUE_SIZE,
+    sample_window=LOG_ERROR_SAMPLE_WINDOW,
+    sample_burst=LOG_ERROR_SAMPLE_BURST,
 )
 
 logger = logging.getLogger(__name__)
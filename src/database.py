@@ -1,14 +1,80 @@
-from typing import AsyncGenerator
+import asyncio
+from typing import AsyncGenerator, Iterator, Sequence
 
+import asyncpg
+from sqlalchemy import Integer, any_, event, exc, literal
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 
-from config import DB_HOST, DB_NAME, DB_PASS, DB_PORT, DB_USER
+from circuit_breaker import CircuitBreaker, ServiceUnavailable
+from config import (
+    DB_COMMAND_TIMEOUT, DB_CONNECT_TIMEOUT, DB_HOST, DB_NAME, DB_PASS,
+    DB_POOL_TIMEOUT, DB_PORT, DB_USER
+)
 
 DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
-engine = create_async_engine(DATABASE_URL)
+
+class DatabaseUnavailable(ServiceUnavailable):
+    pass
+
+
+db_breaker = CircuitBreaker(
+    "PostgreSQL",
+    failures=(
+        OSError, asyncio.TimeoutError,
+        asyncpg.CannotConnectNowError, asyncpg.TooManyConnectionsError,
+    ),
+    error=DatabaseUnavailable,
+)
+
+base = declarative_base()
+
+
+async def _connect() -> asyncpg.Connection:
+    async with db_breaker:
+        return await asyncpg.connect(
+            host=DB_HOST, port=int(DB_PORT), user=DB_USER, password=DB_PASS,
+            database=DB_NAME, timeout=DB_CONNECT_TIMEOUT,
+            command_timeout=DB_COMMAND_TIMEOUT,
+        )
+
+
+class _Pool(AsyncAdaptedQueuePool):
+    def _do_get(self):
+        # Все соединения заняты дольше DB_POOL_TIMEOUT: отвечаем 503,
+        # а не копим ожидающие запросы.
+        try:
+            return super()._do_get()
+        except exc.TimeoutError as error:
+            raise DatabaseUnavailable("PostgreSQL", 1) from error
+
+
+engine = create_async_engine(
+    DATABASE_URL, async_creator=_connect, poolclass=_Pool,
+    pool_timeout=DB_POOL_TIMEOUT,
+)
+
+
+@event.listens_for(engine.sync_engine, "handle_error")
+def _handle_error(context):
+    if context.is_disconnect or isinstance(
+        context.original_exception, db_breaker.failures
+    ):
+        # Пул сбрасывается, и новые соединения идут через db_breaker.
+        context.is_disconnect = True
+        db_breaker.record_failure()
+        return db_breaker.unavailable()
+
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def _after_cursor_execute(*args):
+    db_breaker.record_success()
+
+
 async_session_maker = sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
 )
@@ -17,3 +83,13 @@ async_session_maker = sessionmaker(
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
     async with async_session_maker() as session:
         yield session
+
+
+def in_ids(column, ids):
+    """`column = ANY($1)`: один подготовленный запрос для любого числа id."""
+    return column == any_(literal(list(ids), ARRAY(Integer)))
+
+
+def chunked(ids: Sequence[int], size: int) -> Iterator[Sequence[int]]:
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
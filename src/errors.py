@@ -0,0 +1,6 @@
+class BadRequest(Exception):
+    """Неверные параметры запроса: main отвечает 400 с details."""
+
+    def __init__(self, details: str):
+        super().__init__(details)
+        self.details = details
@@ -0,0 +1,37 @@
+from typing import Optional
+
+from fastapi import Query
+
+from errors import BadRequest
+
+
+def sparse_fields(model):
+    """
+    Зависимость для параметра ?fields=id,title,price: список колонок
+    model, которые нужно вернуть, или None, если нужны все.
+    id возвращается всегда.
+    """
+    columns = model.__table__.columns.keys()
+
+    def get_fields(
+        fields: Optional[str] = Query(
+            default=None, description=f"Через запятую: {', '.join(columns)}"
+        )
+    ) -> Optional[list[str]]:
+        if fields is None:
+            return None
+
+        names = [name.strip() for name in fields.split(",") if name.strip()]
+        unknown = [name for name in names if name not in columns]
+        if unknown:
+            raise BadRequest(f"Unknown fields: {', '.join(unknown)}")
+        return list(dict.fromkeys(["id", *names]))
+
+    return get_fields
+
+
+def field_columns(model, fields: Optional[list[str]]) -> list:
+    """Что выбирать в select: модель целиком или только нужные колонки."""
+    if fields is None:
+        return [model]
+    return [model.__table__.c[name] for name in fields]
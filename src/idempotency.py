@@ -0,0 +1,188 @@
+import asyncio
+import base64
+import hashlib
+import json
+import time
+from typing import Optional
+
+from redis.exceptions import RedisError
+from starlette.datastructures import Headers
+from starlette.requests import HTTPConnection
+from starlette.responses import JSONResponse
+
+from auth.base_config import cookie_transport
+from caching import redis_breaker, redis_client
+from config import (
+    IDEMPOTENCY_LOCK_TIMEOUT, IDEMPOTENCY_TTL, IDEMPOTENCY_WAIT_TIMEOUT,
+    logger
+)
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+POLL_INTERVAL = 0.05
+# Вход и регистрация отдают токены, их ответы в Redis не сохраняются.
+EXCLUDED_PREFIXES = ("/auth/",)
+
+
+def idempotency_key(scope, key: str) -> str:
+    """Ключ в Redis: один и тот же Idempotency-Key у разных сессий разный."""
+    session = HTTPConnection(scope).cookies.get(
+        cookie_transport.cookie_name, ""
+    )
+    digest = hashlib.sha256(
+        "\n".join((session, scope["path"], key)).encode()
+    ).hexdigest()
+    return f"idempotency:{digest}"
+
+
+def _error(status_code: int, details: str, headers: Optional[dict] = None):
+    return JSONResponse(status_code=status_code, headers=headers, content={
+        "status": "error",
+        "data": None,
+        "details": details
+    })
+
+
+async def _read_body(receive) -> bytes:
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+async def _wait_for_response(key: str) -> Optional[dict]:
+    """
+    Ждет, пока первый запрос с тем же ключом сохранит ответ. None, если
+    он не успел за IDEMPOTENCY_WAIT_TIMEOUT секунд или завершился ошибкой.
+    """
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT_TIMEOUT
+    interval = POLL_INTERVAL
+    while time.monotonic() < deadline:
+        await asyncio.sleep(interval)
+        interval = min(interval * 2, 0.5)
+        async with redis_breaker:
+            value = await redis_client.get(key)
+        if value is None:
+            return None
+        stored = json.loads(value)
+        if "status" in stored:
+            return stored
+    return None
+
+
+class IdempotencyMiddleware:
+    """
+    POST-запрос с заголовком Idempotency-Key выполняется один раз:
+    ответ хранится в Redis IDEMPOTENCY_TTL секунд и отдается повторным
+    запросам без обращения к базе. Повтор, пришедший до завершения
+    первого запроса, ждет его ответа. Ответы 5xx не сохраняются,
+    такой запрос можно повторить.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or (
+            scope["path"].startswith(EXCLUDED_PREFIXES)
+        ):
+            return await self.app(scope, receive, send)
+
+        key = Headers(scope=scope).get(IDEMPOTENCY_HEADER)
+        if key is None:
+            return await self.app(scope, receive, send)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return await _error(
+                400, f"{IDEMPOTENCY_HEADER} must be 1-{MAX_KEY_LENGTH} chars"
+            )(scope, receive, send)
+
+        body = await _read_body(receive)
+        fingerprint = hashlib.sha256(body).hexdigest()
+        key = idempotency_key(scope, key)
+
+        async def receive_body():
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        try:
+            async with redis_breaker:
+                locked = await redis_client.set(
+                    key, json.dumps({"fingerprint": fingerprint}),
+                    nx=True, ex=IDEMPOTENCY_LOCK_TIMEOUT
+                )
+                stored = None if locked else await redis_client.get(key)
+            if not locked and stored is not None:
+                stored = json.loads(stored)
+                if stored["fingerprint"] != fingerprint:
+                    return await _error(
+                        422,
+                        f"{IDEMPOTENCY_HEADER} was used with another request"
+                    )(scope, receive, send)
+                if "status" not in stored:
+                    stored = await _wait_for_response(key)
+                if stored is None:
+                    return await _error(
+                        409, "A request with this key is in progress",
+                        headers={"Retry-After": "1"}
+                    )(scope, receive, send)
+                return await self._replay(stored, send)
+        except RedisError as error:
+            logger.warning(
+                f"Idempotency-Key не проверен, Redis недоступен: {error}"
+            )
+            return await self.app(scope, receive_body, send)
+
+        await self._run(scope, receive_body, send, key, fingerprint)
+
+    async def _run(self, scope, receive, send, key: str, fingerprint: str):
+        response = {"fingerprint": fingerprint, "body": b""}
+
+        async def send_and_store(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = [
+                    [name.decode("latin-1"), value.decode("latin-1")]
+                    for name, value in message["headers"]
+                ]
+            elif message["type"] == "http.response.body":
+                response["body"] += message.get("body", b"")
+            await send(message)
+
+        stored = False
+        try:
+            await self.app(scope, receive, send_and_store)
+            if response.get("status", 500) < 500:
+                response["body"] = base64.b64encode(
+                    response["body"]
+                ).decode()
+                async with redis_breaker:
+                    await redis_client.set(
+                        key, json.dumps(response), ex=IDEMPOTENCY_TTL
+                    )
+                stored = True
+        except RedisError as error:
+            logger.warning(f"Не удалось сохранить ответ по ключу: {error}")
+        finally:
+            if not stored:
+                try:
+                    async with redis_breaker:
+                        await redis_client.delete(key)
+                except RedisError:
+                    pass
+
+    @staticmethod
+    async def _replay(stored: dict, send):
+        await send({
+            "type": "http.response.start",
+            "status": stored["status"],
+            "headers": [
+                (name.encode("latin-1"), value.encode("latin-1"))
+                for name, value in stored["headers"]
+            ] + [(REPLAYED_HEADER.lower().encode(), b"true")],
+        })
+        await send({
+            "type": "http.response.body",
+            "body": base64.b64decode(stored["body"]),
+        })
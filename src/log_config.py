@@ -0,0 +1,172 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import sys
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+SAMPLER_MAX_KEYS = 1000
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(
+                record.created, timezone.utc
+            ).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "pid": record.process,
+            "message": record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        for field in ("suppressed", "dropped"):
+            if hasattr(record, field):
+                entry[field] = getattr(record, field)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class ErrorSampler(logging.Filter):
+    """
+    Пропускает не больше burst одинаковых ошибок за window секунд.
+    Одинаковыми считаются ошибки с совпадающей первой строкой сообщения.
+    Число отброшенных повторов пишется в первую запись следующего окна.
+    """
+
+    def __init__(self, window: int, burst: int):
+        super().__init__()
+        self.window = window
+        self.burst = burst
+        self._seen = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.ERROR or self.burst <= 0:
+            return True
+
+        key = (record.name, record.getMessage().split("\n", 1)[0])
+        now = time.monotonic()
+        started, count, suppressed = self._seen.get(key, (now, 0, 0))
+        if now - started >= self.window:
+            started, count = now, 0
+
+        if count < self.burst:
+            if suppressed:
+                record.suppressed = suppressed
+            self._remember(key, (started, count + 1, 0))
+            return True
+
+        self._remember(key, (started, count, suppressed + 1))
+        return False
+
+    def _remember(self, key, value):
+        if key not in self._seen and len(self._seen) >= SAMPLER_MAX_KEYS:
+            self._seen.clear()
+        self._seen[key] = value
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Кладет записи в ограниченную очередь и не ждет, если она заполнена:
+    запись отбрасывается, а их число передается со следующей записью.
+    """
+
+    dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(
+                record.exc_info
+            )
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            if self.dropped:
+                record.dropped = self.dropped
+            self.queue.put_nowait(record)
+            self.dropped = 0
+        except queue.Full:
+            self.dropped += 1
+
+
+class LogListener(QueueListener):
+    def enqueue_sentinel(self):
+        # При остановке очередь может быть заполнена, ждем места.
+        self.queue.put(self._sentinel)
+
+
+def worker_log_file(filename: str, pid: int) -> str:
+    """logfile.log -> logfile.<pid>.log"""
+    root, ext = os.path.splitext(filename)
+    return f"{root}.{pid}{ext}"
+
+
+def setup_logging(
+    filename: str,
+    max_bytes: int,
+    backup_count: int,
+    queue_size: int,
+    sample_window: int,
+    sample_burst: int,
+):
+    """
+    Запись логов в консоль и файл с ротацией идет в отдельном потоке:
+    обработчики запросов только кладут запись в очередь.
+    Процесс, созданный fork (воркер gunicorn), пишет в свой файл
+    worker_log_file: ротация одного файла из нескольких процессов
+    переименовывает его из-под остальных, и записи теряются.
+    """
+    formatter = JsonFormatter()
+
+    def file_handler(name: str) -> RotatingFileHandler:
+        handler = RotatingFileHandler(
+            name,
+            maxBytes=max_bytes,
+            backupCount=backup_count,
+            encoding="utf-8",
+            delay=True,
+        )
+        handler.setFormatter(formatter)
+        return handler
+
+    console = logging.StreamHandler(sys.stdout)
+    console.setFormatter(formatter)
+    handlers = (console, file_handler(filename))
+
+    queue_handler = DroppingQueueHandler(queue.Queue(queue_size))
+    queue_handler.addFilter(ErrorSampler(sample_window, sample_burst))
+    logging.basicConfig(level=logging.INFO, handlers=(queue_handler,))
+
+    listener = LogListener(
+        queue_handler.queue, *handlers, respect_handler_level=True
+    )
+    listener.start()
+
+    def restart_after_fork():
+        # Поток слушателя не переживает fork (gunicorn с preload_app),
+        # а блокировки старой очереди могли остаться занятыми.
+        nonlocal listener, handlers
+        handlers[1].close()
+        handlers = (
+            console, file_handler(worker_log_file(filename, os.getpid()))
+        )
+        queue_handler.queue = queue.Queue(queue_size)
+        listener = LogListener(
+            queue_handler.queue, *handlers, respect_handler_level=True
+        )
+        listener.start()
+
+    os.register_at_fork(after_in_child=restart_after_fork)
+    atexit.register(lambda: listener.stop())
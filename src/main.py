@@ -1,18 +1,38 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi_cache import FastAPICache
-from fastapi_cache.backends.redis import RedisBackend
-from redis import asyncio as aioredis
 
 from auth.schemas import UserRead, UserCreate
 from auth.base_config import auth_backend, fastapi_users
 from ads.routers import router as router_ads
 from auth.routers import router as router_auth
-from config import REDIS_HOST, REDIS_PORT
+from ads.cleanup import purge_deleted_ads
+from ads.counters import flush_views
+from ads.feed import broadcaster
+from caching import (
+    CacheBackend, CacheCoder, StaleCacheMiddleware, key_builder, redis_client
+)
 from complaints.routers import router as router_complaints
+from compression import CompressionMiddleware
+from config import PURGE_INTERVAL, SQL_PROFILING, VIEWS_FLUSH_INTERVAL
+from database import DatabaseUnavailable, engine
+from errors import BadRequest
+from idempotency import IdempotencyMiddleware
+from partitions import maintain_partitions
+from profiling.profiler import ProfilingMiddleware, profiler
+from profiling.routers import router as router_profiling
+from scheduler import scheduler
+from warmup import warm_up_cache
 
 app = FastAPI(
     title="Blitz Market"
 )
+app.add_middleware(IdempotencyMiddleware)
+app.add_middleware(StaleCacheMiddleware)
+app.add_middleware(CompressionMiddleware)
+if SQL_PROFILING:
+    profiler.install(engine.sync_engine)
+    app.add_middleware(ProfilingMiddleware)
 
 app.include_router(
     fastapi_users.get_auth_router(auth_backend),
@@ -29,12 +49,49 @@ app.include_router(
 app.include_router(router_ads)
 app.include_router(router_auth)
 app.include_router(router_complaints)
+app.include_router(router_profiling)
+
+
+@app.exception_handler(DatabaseUnavailable)
+async def database_unavailable_handler(
+    request: Request, error: DatabaseUnavailable
+):
+    return JSONResponse(status_code=503, content={
+        "status": "error",
+        "data": None,
+        "details": "Service temporarily unavailable"
+    }, headers={"Retry-After": str(error.retry_after)})
+
+
+@app.exception_handler(BadRequest)
+async def bad_request_handler(request: Request, error: BadRequest):
+    return JSONResponse(status_code=400, content={
+        "status": "error",
+        "data": None,
+        "details": error.details
+    })
 
 
 @app.on_event("startup")
 async def startup_event():
-    redis = aioredis.from_url(
-        f"redis://{REDIS_HOST}:{REDIS_PORT}",
-        encoding="utf8", decode_responses=True
+    FastAPICache.init(
+        CacheBackend(redis_client), prefix="fastapi-cache",
+        coder=CacheCoder, key_builder=key_builder
     )
-    FastAPICache.init(RedisBackend(redis), prefix="fastapi-cache")
+    await warm_up_cache()
+    scheduler.add_job(flush_views, "interval", seconds=VIEWS_FLUSH_INTERVAL)
+    scheduler.add_job(purge_deleted_ads, "interval", seconds=PURGE_INTERVAL)
+    scheduler.add_job(maintain_partitions, "cron", hour=3)
+    scheduler.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    scheduler.shutdown(wait=False)
+    await broadcaster.stop()
+    await flush_views()
+
+
+@app.get("/health", tags=["health"])
+async def health():
+    return {"status": "ready"}
@@ -0,0 +1,230 @@
+import asyncio
+import gzip
+import json
+import os
+import re
+import sys
+from datetime import date, datetime, timezone
+
+from sqlalchemy import text
+
+from config import ARCHIVE_AFTER_MONTHS, ARCHIVE_DIR, PARTITIONS_AHEAD, logger
+from database import engine
+from scheduler import exclusive_job
+
+PARTITIONED_TABLES = ("ad", "comment", "review")
+PARTITIONS_LOCK = "partitions:lock"
+PARTITIONS_LOCK_TTL = 60 * 60
+# Записи, ссылающиеся на объявления секции ad: они архивируются
+# и удаляются вместе с ней. Статистика жалоб только удаляется.
+AD_CHILDREN = (
+    ("comment", "ad_id"), ("review", "ad_id"), ("complaint", "for_ad")
+)
+AD_DERIVED = (("ad_complaint_stats", "ad_id"),)
+ARCHIVE_WRITE_BUFFER = 1024 * 1024
+
+
+def _month_start(day: date) -> date:
+    return date(day.year, day.month, 1)
+
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _partition_name(table: str, month: date) -> str:
+    return f"{table}_y{month.year}m{month.month:02d}"
+
+
+def _partition_month(table: str, name: str):
+    match = re.fullmatch(rf"{table}_y(\d{{4}})m(\d{{2}})", name)
+    if match is None:
+        return None
+    return date(int(match[1]), int(match[2]), 1)
+
+
+def _bound(month: date) -> str:
+    return f"{month.isoformat()} 00:00:00+00:00"
+
+
+async def _get_partitions(conn, table: str) -> dict[date, str]:
+    result = await conn.execute(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE parent.relname = :table"
+    ), {"table": table})
+    partitions = {}
+    for name in result.scalars():
+        month = _partition_month(table, name)
+        if month is not None:
+            partitions[month] = name
+    return partitions
+
+
+async def create_partitions():
+    """Создает месячные секции на PARTITIONS_AHEAD месяцев вперед."""
+    this_month = _month_start(datetime.now(timezone.utc).date())
+    async with engine.begin() as conn:
+        for table in PARTITIONED_TABLES:
+            existing = await _get_partitions(conn, table)
+            for offset in range(PARTITIONS_AHEAD + 1):
+                month = _add_months(this_month, offset)
+                if month in existing:
+                    continue
+                await conn.execute(text(
+                    f"CREATE TABLE {_partition_name(table, month)} "
+                    f"PARTITION OF {table} FOR VALUES FROM "
+                    f"('{_bound(month)}') "
+                    f"TO ('{_bound(_add_months(month, 1))}')"
+                ))
+                logger.info(f"Создана секция {_partition_name(table, month)}")
+
+
+async def _export(path: str, copy) -> str:
+    """
+    Выгружает COPY в сжатый файл. Сжатие и запись идут в отдельном
+    потоке пачками по ARCHIVE_WRITE_BUFFER байт, цикл событий
+    в это время обслуживает запросы.
+    """
+    await asyncio.to_thread(os.makedirs, ARCHIVE_DIR, exist_ok=True)
+    archive = await asyncio.to_thread(gzip.open, f"{path}.tmp", "wb")
+    buffer = bytearray()
+
+    async def write(chunk):
+        buffer.extend(chunk)
+        if len(buffer) >= ARCHIVE_WRITE_BUFFER:
+            data = bytes(buffer)
+            buffer.clear()
+            await asyncio.to_thread(archive.write, data)
+
+    try:
+        async with engine.connect() as conn:
+            raw_connection = await conn.get_raw_connection()
+            await copy(raw_connection.driver_connection, write)
+        await asyncio.to_thread(archive.write, bytes(buffer))
+    finally:
+        await asyncio.to_thread(archive.close)
+    await asyncio.to_thread(os.replace, f"{path}.tmp", path)
+    return path
+
+
+async def _export_partition(name: str) -> str:
+    return await _export(
+        os.path.join(ARCHIVE_DIR, f"{name}.csv.gz"),
+        lambda connection, output: connection.copy_from_table(
+            name, output=output, format="csv", header=True
+        )
+    )
+
+
+async def _export_ad_children(name: str):
+    """Комментарии, отзывы и жалобы объявлений секции name."""
+    for table, column in AD_CHILDREN:
+        query = (
+            f"SELECT * FROM {table} "
+            f"WHERE {column} IN (SELECT id FROM {name})"
+        )
+        await _export(
+            os.path.join(ARCHIVE_DIR, f"{name}_{table}.csv.gz"),
+            lambda connection, output, query=query: (
+                connection.copy_from_query(
+                    query, output=output, format="csv", header=True
+                )
+            )
+        )
+
+
+async def archive_partitions():
+    """
+    Выгружает секции старше ARCHIVE_AFTER_MONTHS месяцев в сжатые
+    CSV-файлы в ARCHIVE_DIR, затем отсоединяет и удаляет их.
+    Вместе с секцией ad архивируются и удаляются комментарии, отзывы
+    и жалобы ее объявлений из любых секций, а также их статистика жалоб.
+    Выгрузка идет до отсоединения, поэтому при сбое секция остается
+    в таблице и будет выгружена повторно при следующем запуске.
+    """
+    cutoff = _add_months(
+        _month_start(datetime.now(timezone.utc).date()), -ARCHIVE_AFTER_MONTHS
+    )
+    for table in PARTITIONED_TABLES:
+        async with engine.connect() as conn:
+            partitions = await _get_partitions(conn, table)
+
+        for month, name in sorted(partitions.items()):
+            if month >= cutoff:
+                continue
+            path = await _export_partition(name)
+            if table == "ad":
+                await _export_ad_children(name)
+            async with engine.begin() as conn:
+                if table == "ad":
+                    for child, column in AD_CHILDREN + AD_DERIVED:
+                        await conn.execute(text(
+                            f"DELETE FROM {child} "
+                            f"WHERE {column} IN (SELECT id FROM {name})"
+                        ))
+                await conn.execute(
+                    text(f"ALTER TABLE {table} DETACH PARTITION {name}")
+                )
+                await conn.execute(text(f"DROP TABLE {name}"))
+            logger.info(f"Секция {name} перенесена в архив {path}")
+
+
+@exclusive_job(PARTITIONS_LOCK, PARTITIONS_LOCK_TTL)
+async def maintain_partitions():
+    await create_partitions()
+    await archive_partitions()
+
+
+async def explain_pruning() -> dict[str, list[str]]:
+    """
+    Секции, которые Postgres читает для выборки за текущий месяц.
+    При работающем отсечении секций для каждой таблицы это одна секция.
+    """
+    month = _month_start(datetime.now(timezone.utc).date())
+    scanned = {}
+    async with engine.connect() as conn:
+        for table in PARTITIONED_TABLES:
+            result = await conn.execute(text(
+                f"EXPLAIN (FORMAT JSON) SELECT * FROM {table} "
+                f"WHERE created_at >= :start AND created_at < :end"
+            ), {
+                "start": datetime.fromisoformat(_bound(month)),
+                "end": datetime.fromisoformat(_bound(_add_months(month, 1))),
+            })
+            plan = result.scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            scanned[table] = _relations(plan[0]["Plan"])
+    return scanned
+
+
+def _relations(plan: dict) -> list[str]:
+    relations = []
+    if "Relation Name" in plan:
+        relations.append(plan["Relation Name"])
+    for subplan in plan.get("Plans", []):
+        relations.extend(_relations(subplan))
+    return relations
+
+
+async def main(command: str):
+    if command == "create":
+        await create_partitions()
+    elif command == "archive":
+        await archive_partitions()
+    elif command == "explain":
+        scanned = await explain_pruning()
+        for table, relations in scanned.items():
+            print(f"{table}: {', '.join(relations)}")
+        if any(len(relations) != 1 for relations in scanned.values()):
+            sys.exit("Отсечение секций не работает")
+    else:
+        sys.exit("Использование: python partitions.py create|archive|explain")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else "explain"))
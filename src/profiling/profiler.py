@@ -0,0 +1,175 @@
+import heapq
+import itertools
+import time
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import event
+
+from config import (
+    SQL_PROFILING_N_PLUS_ONE, SQL_PROFILING_SLOW_QUERIES, logger
+)
+from database import engine
+
+PARAMETERS_MAX_LENGTH = 500
+EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+_request_profile: ContextVar[Optional[dict]] = ContextVar(
+    "request_profile", default=None
+)
+
+
+class QueryProfiler:
+    """
+    Собирает самые медленные запросы к базе и повторы одного запроса
+    в пределах HTTP-запроса (N+1). Слушатели событий engine
+    регистрируются только в install(), без нее накладных расходов нет.
+    """
+
+    def __init__(self, slow_queries: int, n_plus_one: int):
+        self.slow_queries = slow_queries
+        self.n_plus_one = n_plus_one
+        self.enabled = False
+        self.reset()
+
+    def reset(self):
+        # Куча из slow_queries самых медленных запросов: в корне
+        # самый быстрый из них, он вытесняется первым.
+        self._slowest = []
+        self._order = itertools.count()
+        self._repeated = {}
+
+    def install(self, sync_engine):
+        event.listen(
+            sync_engine, "before_cursor_execute", self._before, retval=True
+        )
+        event.listen(sync_engine, "after_cursor_execute", self._after)
+        self.enabled = True
+
+    @staticmethod
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+        profile = _request_profile.get()
+        if profile is not None:
+            # Маршрут в комментарии виден в логах и pg_stat_activity.
+            route = route_name(profile["scope"]).replace("*/", "")
+            statement = f"{statement} /* route={route} */"
+        return statement, parameters
+
+    def _after(self, conn, cursor, statement, parameters, *args):
+        duration = time.perf_counter() - conn.info["query_start"].pop()
+        if statement.startswith("EXPLAIN "):
+            return
+        profile = _request_profile.get()
+        if profile is not None:
+            statement = statement.rsplit(" /* route=", 1)[0]
+            profile["statements"][statement] += 1
+        self._record(statement, parameters, duration, profile)
+
+    def _record(self, statement, parameters, duration, profile):
+        if len(self._slowest) == self.slow_queries and (
+            duration <= self._slowest[0][0]
+        ):
+            return
+        query = {
+            "duration_ms": round(duration * 1000, 3),
+            "route": route_name(profile["scope"]) if profile else None,
+            "statement": statement,
+            "parameters": repr(parameters)[:PARAMETERS_MAX_LENGTH],
+            "executed_at": datetime.now(timezone.utc),
+            "plan": None,
+        }
+        entry = (duration, next(self._order), query, parameters)
+        if len(self._slowest) < self.slow_queries:
+            heapq.heappush(self._slowest, entry)
+        else:
+            heapq.heapreplace(self._slowest, entry)
+
+    def finish_request(self, profile: dict):
+        route = route_name(profile["scope"])
+        for statement, count in profile["statements"].items():
+            if count < self.n_plus_one:
+                continue
+            repeated = self._repeated.setdefault((route, statement), {
+                "route": route,
+                "statement": statement,
+                "requests": 0,
+                "max_executions": 0,
+            })
+            repeated["requests"] += 1
+            repeated["max_executions"] = max(
+                repeated["max_executions"], count
+            )
+            if repeated["requests"] == 1:
+                logger.warning(
+                    f"Возможный N+1 в {route}: запрос выполнен {count} раз"
+                    f" за один HTTP-запрос\n{statement}"
+                )
+
+    def slowest(self) -> list[dict]:
+        return [query for _, _, query, _ in sorted(
+            self._slowest, key=lambda entry: entry[:2], reverse=True
+        )]
+
+    def repeated(self) -> list[dict]:
+        return sorted(
+            self._repeated.values(),
+            key=lambda repeated: repeated["max_executions"], reverse=True
+        )
+
+    async def explain(self):
+        """
+        Строит планы медленных запросов, у которых их еще нет. EXPLAIN
+        без ANALYZE не выполняет запрос, поэтому безопасен и для
+        INSERT/UPDATE/DELETE.
+        """
+        pending = [
+            (query, parameters) for _, _, query, parameters in self._slowest
+            if query["plan"] is None
+            and query["statement"].lstrip().upper().startswith(EXPLAINABLE)
+        ]
+        if not pending:
+            return
+        token = _request_profile.set(None)
+        try:
+            async with engine.connect() as conn:
+                for query, parameters in pending:
+                    try:
+                        result = await conn.exec_driver_sql(
+                            f"EXPLAIN {query['statement']}", parameters
+                        )
+                        query["plan"] = [row[0] for row in result]
+                    except Exception as error:
+                        query["plan"] = [f"EXPLAIN failed: {error}"]
+                        await conn.rollback()
+        finally:
+            _request_profile.reset(token)
+
+
+def route_name(scope) -> str:
+    route = scope.get("route")
+    return f"{scope['method']} {getattr(route, 'path', scope['path'])}"
+
+
+profiler = QueryProfiler(SQL_PROFILING_SLOW_QUERIES, SQL_PROFILING_N_PLUS_ONE)
+
+
+class ProfilingMiddleware:
+    """Привязывает запросы к базе к маршруту текущего HTTP-запроса."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        profile = {"scope": scope, "statements": Counter()}
+        token = _request_profile.set(profile)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_profile.reset(token)
+            profiler.finish_request(profile)
@@ -0,0 +1,73 @@
+import os
+import traceback
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import JSONResponse
+
+from auth.base_config import current_user
+from auth.models import RoleType, User
+from config import logger
+from constants import CRITICAL_ERROR
+from database import DatabaseUnavailable
+from profiling.profiler import profiler
+from telegram_bot import send_message_to_telegram
+
+router = APIRouter(
+    prefix="/profiling",
+    tags=["Profiling"]
+)
+
+
+def _forbidden() -> JSONResponse:
+    return JSONResponse(status_code=403, content={
+        "status": "error",
+        "data": None,
+        "details": "You dont have access to this"
+    })
+
+
+@router.get("/queries", responses={
+    403: {"description": "Access forbidden for this role"},
+    500: {"description": "Internal Server Error"}
+})
+async def get_profiled_queries(
+    explain: bool = False,
+    current_user: User = Depends(current_user)
+):
+    """
+    Самые медленные запросы к базе и повторы одного запроса за
+    HTTP-запрос. Данные собирает каждый воркер отдельно.
+    explain=true дополнительно строит планы запросов.
+    """
+    try:
+        if current_user.role != RoleType.admin:
+            return _forbidden()
+
+        if explain:
+            await profiler.explain()
+        return {
+            "status": "success",
+            "data": {
+                "enabled": profiler.enabled,
+                "pid": os.getpid(),
+                "slowest": profiler.slowest(),
+                "n_plus_one": profiler.repeated(),
+            },
+            "details": None
+        }
+
+    except DatabaseUnavailable:
+        raise
+    except Exception as error:
+        logger.error(f"{error}\n{traceback.format_exc()}")
+        send_message_to_telegram(error)
+        raise HTTPException(status_code=500, detail=CRITICAL_ERROR)
+
+
+@router.delete("/queries", status_code=204, responses={
+    403: {"description": "Access forbidden for this role"}
+})
+async def reset_profiled_queries(current_user: User = Depends(current_user)):
+    if current_user.role != RoleType.admin:
+        return _forbidden()
+    profiler.reset()
@@ -0,0 +1,33 @@
+import functools
+import traceback
+
+import pytz
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+from caching import redis_client
+from config import logger
+
+scheduler = AsyncIOScheduler(timezone=pytz.utc)
+
+
+def exclusive_job(lock: str, ttl: int):
+    """
+    Задачи планировщика запускаются в каждом воркере,
+    декоратор не дает им выполняться одновременно.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper():
+            try:
+                if not await redis_client.set(lock, 1, nx=True, ex=ttl):
+                    return
+                try:
+                    await func()
+                finally:
+                    await redis_client.delete(lock)
+
+            except Exception as error:
+                logger.error(f"{error}\n{traceback.format_exc()}")
+
+        return wrapper
+    return decorator
@@ -0,0 +1,86 @@
+"""
+Замер времени импорта приложения и памяти воркеров.
+
+    python startup_benchmark.py [--runs 5] [--master PID]
+
+Без --master импортирует main в отдельных процессах и выводит время
+импорта и RSS после него. С --master выводит память каждого воркера
+запущенного gunicorn: Pss учитывает общие с мастером страницы
+пропорционально, Private - память, которая есть только у воркера.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+IMPORT_SCRIPT = """
+import resource, time
+started = time.perf_counter()
+import main
+print(time.perf_counter() - started)
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+def measure_import(runs: int):
+    times, rss = [], []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", IMPORT_SCRIPT],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.split()
+        times.append(float(output[-2]))
+        rss.append(int(output[-1]) / 1024)
+
+    print(f"Импорт main: медиана {statistics.median(times) * 1000:.0f} мс, "
+          f"минимум {min(times) * 1000:.0f} мс ({runs} запусков)")
+    print(f"RSS после импорта: {statistics.median(rss):.1f} МБ")
+
+
+def _children(pid: int) -> list[int]:
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as stat:
+                ppid = int(stat.read().rsplit(")", 1)[1].split()[1])
+        except OSError:
+            continue
+        if ppid == pid:
+            children.append(int(entry))
+    return children
+
+
+def _memory(pid: int) -> dict[str, float]:
+    memory = {}
+    with open(f"/proc/{pid}/smaps_rollup") as smaps:
+        for line in smaps:
+            name, _, value = line.partition(":")
+            if value.strip().endswith("kB"):
+                memory[name] = int(value.split()[0]) / 1024
+    return memory
+
+
+def measure_workers(master: int):
+    print(f"{'PID':>8} {'Rss':>8} {'Pss':>8} {'Shared':>8} {'Private':>8}")
+    for pid in [master] + _children(master):
+        memory = _memory(pid)
+        shared = memory["Shared_Clean"] + memory["Shared_Dirty"]
+        private = memory["Private_Clean"] + memory["Private_Dirty"]
+        print(f"{pid:>8} {memory['Rss']:>8.1f} {memory['Pss']:>8.1f} "
+              f"{shared:>8.1f} {private:>8.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--master", type=int)
+    args = parser.parse_args()
+
+    if args.master:
+        measure_workers(args.master)
+    else:
+        measure_import(args.runs)
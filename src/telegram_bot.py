@@ -1,19 +1,50 @@
+import functools
+import threading
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 
-import telegram
+from config import (
+    TELEGRAM_CHAT_ID, TELEGRAM_MAX_PENDING, TELEGRAM_TOKEN, logger
+)
 
-from config import TELEGRAM_TOKEN, TELEGRAM_CHAT_ID, logger
+TELEGRAM_TIMEOUT = 5
 
-bot = telegram.Bot(token=TELEGRAM_TOKEN)
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="telegram")
+_pending = threading.BoundedSemaphore(TELEGRAM_MAX_PENDING)
 
 
-def send_message_to_telegram(message, bot=bot):
+@functools.lru_cache(maxsize=None)
+def get_bot():
+    import telegram
+
+    return telegram.Bot(token=TELEGRAM_TOKEN)
+
+
+def _send(text: str, bot):
+    import telegram
+
     try:
-        bot.send_message(
-            TELEGRAM_CHAT_ID,
-            f"произошла ошибка: {message}\n {traceback.format_exc()}"
+        (bot or get_bot()).send_message(
+            TELEGRAM_CHAT_ID, text, timeout=TELEGRAM_TIMEOUT
         )
         logger.info("Сообщение с критической ошибкой отправлено в телеграм")
 
     except telegram.TelegramError as error:
         logger.error(f"{error}\n{traceback.format_exc()}")
+    finally:
+        _pending.release()
+
+
+def send_message_to_telegram(message, bot=None):
+    """
+    Отправляет сообщение в фоновом потоке и не блокирует обработчик.
+    Если неотправленных сообщений уже TELEGRAM_MAX_PENDING, новое
+    отбрасывается.
+    """
+    if not _pending.acquire(blocking=False):
+        logger.warning("Очередь сообщений в телеграм заполнена")
+        return
+
+    _executor.submit(
+        _send, f"произошла ошибка: {message}\n {traceback.format_exc()}", bot
+    )
@@ -0,0 +1,87 @@
+import asyncio
+import time
+import traceback
+
+from access_log import DETAIL_ACCESS_LOG, LIST_ACCESS_LOG, get_top_accessed
+from ads.counters import get_trending_ids
+from ads.models import AdType
+from ads.routers import get_detail_ad, get_list_ads
+from caching import redis_client
+from config import (
+    CACHE_WARMUP_PAGES, CACHE_WARMUP_SIZES, CACHE_WARMUP_TIMEOUT,
+    CACHE_WARMUP_TOP_ADS, logger
+)
+from database import async_session_maker
+
+WARMUP_LOCK = "cache-warmup:lock"
+
+
+async def _get_list_pages() -> set[tuple[AdType, int, int]]:
+    pages = {
+        (ads_type, page, size)
+        for ads_type in AdType
+        for size in CACHE_WARMUP_SIZES
+        for page in range(1, CACHE_WARMUP_PAGES + 1)
+    }
+    for member in await get_top_accessed(
+        LIST_ACCESS_LOG, CACHE_WARMUP_TOP_ADS
+    ):
+        ads_type, page, size = member.split(":")
+        pages.add((AdType(ads_type), int(page), int(size)))
+    return pages
+
+
+async def _fill_cache():
+    pages = await _get_list_pages()
+    ad_ids = set(map(int, await get_top_accessed(
+        DETAIL_ACCESS_LOG, CACHE_WARMUP_TOP_ADS
+    )))
+    ad_ids.update(
+        ad_id for ad_id, _ in await get_trending_ids(CACHE_WARMUP_TOP_ADS)
+    )
+
+    async with async_session_maker() as session:
+        for ads_type, page, size in pages:
+            await get_list_ads(
+                ads_type=ads_type, page=page, size=size, geo=None, fields=None,
+                session=session
+            )
+        for ad_id in ad_ids:
+            await get_detail_ad(ad_id=ad_id, session=session)
+
+    logger.info(
+        f"Кеш прогрет: {len(pages)} страниц списка, {len(ad_ids)} объявлений"
+    )
+
+
+async def _wait_for_other_worker(deadline: float):
+    while time.monotonic() < deadline and await redis_client.exists(
+        WARMUP_LOCK
+    ):
+        await asyncio.sleep(0.5)
+
+
+async def warm_up_cache():
+    """
+    Заполняет кеш первыми страницами списков и самыми просматриваемыми
+    объявлениями. Кеш общий, поэтому прогревает его только один воркер,
+    остальные ждут окончания прогрева.
+    """
+    deadline = time.monotonic() + CACHE_WARMUP_TIMEOUT
+    try:
+        acquired = await redis_client.set(
+            WARMUP_LOCK, 1, nx=True, ex=CACHE_WARMUP_TIMEOUT
+        )
+        if not acquired:
+            await _wait_for_other_worker(deadline)
+            return
+
+        try:
+            await asyncio.wait_for(_fill_cache(), CACHE_WARMUP_TIMEOUT)
+        finally:
+            await redis_client.delete(WARMUP_LOCK)
+
+    except Exception as error:
+        logger.error(
+            f"Прогрев кеша не завершен: {error}\n{traceback.format_exc()}"
+        )
@@ -0,0 +1,20 @@
+import os
+import sys
+
+import fakeredis
+from redis import asyncio as aioredis
+
+# База указывает на закрытый порт: каждое подключение к ней завершается
+# ConnectionRefusedError, как при недоступном PostgreSQL.
+os.environ.update(
+    DB_HOST="127.0.0.1", DB_PORT="1", POSTGRES_DB="test",
+    POSTGRES_USER="test", POSTGRES_PASSWORD="test",
+    REDIS_HOST="localhost", REDIS_PORT="6379",
+    TELEGRAM_TOKEN="1:test", ACCESS_LOG_SAMPLE_RATE="0",
+)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+_redis_server = fakeredis.FakeServer()
+aioredis.from_url = lambda *args, **kwargs: fakeredis.aioredis.FakeRedis(
+    server=_redis_server, decode_responses=kwargs.get("decode_responses")
+)
@@ -0,0 +1,99 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from ads.models import AdType
+from caching import (
+    AD_DETAIL_NAMESPACE, AD_LIST_NAMESPACE, STALE_HEADER, CacheBackend,
+    build_cache_key, redis_client, stale_key
+)
+from config import BREAKER_FAILURE_THRESHOLD
+from database import db_breaker
+
+LIST_PARAMS = {"ads_type": "sale", "page": 1, "size": 10}
+CACHED_PAGE = (
+    '{"status": "success", "data": [], "details": null,'
+    ' "page": 1, "size": 10}'
+)
+
+
+async def _noop():
+    pass
+
+
+@pytest.fixture(scope="module")
+def app_client():
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(main, "warm_up_cache", _noop)
+        with TestClient(main.app) as client:
+            yield client
+
+
+@pytest.fixture
+def client(app_client):
+    app_client.portal.call(redis_client.flushall)
+    db_breaker.record_success()
+    yield app_client
+    db_breaker.record_success()
+
+
+def _list_key(**params) -> str:
+    return build_cache_key(AD_LIST_NAMESPACE, **params)
+
+
+def test_database_down_returns_503(client):
+    for _ in range(BREAKER_FAILURE_THRESHOLD + 1):
+        response = client.get("/ads/", params=LIST_PARAMS)
+        assert response.status_code == 503
+        assert int(response.headers["Retry-After"]) >= 1
+        assert response.json()["status"] == "error"
+    assert db_breaker.is_open
+
+    response = client.get("/ads/1")
+    assert response.status_code == 503
+    assert STALE_HEADER not in response.headers
+
+
+def test_stale_copy_served_while_database_down(client):
+    key = _list_key(ads_type=AdType.sale, page=1, size=10)
+    client.portal.call(CacheBackend(redis_client).set, key, CACHED_PAGE, 30)
+    client.portal.call(redis_client.delete, key)
+
+    response = client.get("/ads/", params=LIST_PARAMS)
+    assert response.status_code == 503
+
+    for _ in range(BREAKER_FAILURE_THRESHOLD):
+        db_breaker.record_failure()
+    response = client.get("/ads/", params=LIST_PARAMS)
+    assert response.status_code == 200
+    assert response.headers[STALE_HEADER] == "1"
+    assert response.headers["Cache-Control"] == "no-store"
+    assert "ETag" not in response.headers
+    assert response.json()["status"] == "success"
+
+
+def test_fresh_cache_is_not_marked_stale(client):
+    key = _list_key(ads_type=AdType.sale, page=1, size=10)
+    client.portal.call(CacheBackend(redis_client).set, key, CACHED_PAGE, 30)
+    for _ in range(BREAKER_FAILURE_THRESHOLD):
+        db_breaker.record_failure()
+
+    response = client.get("/ads/", params=LIST_PARAMS)
+    assert response.status_code == 200
+    assert STALE_HEADER not in response.headers
+
+
+@pytest.mark.parametrize("namespace, params, kept", [
+    (AD_LIST_NAMESPACE, {"ads_type": "sale", "page": 1, "size": 10}, True),
+    (AD_DETAIL_NAMESPACE, {"ad_id": 1}, True),
+    (AD_LIST_NAMESPACE, {"ads_type": "sale", "fields": "id"}, False),
+    (AD_LIST_NAMESPACE, {"ads_type": "sale", "geo": "55.7,37.6,10"}, False),
+    ("ads.routers:get_trending_ads", {"limit": 10}, False),
+])
+def test_stale_copy_only_for_lists_and_details(
+    client, namespace, params, kept
+):
+    key = build_cache_key(namespace, **params)
+    client.portal.call(CacheBackend(redis_client).set, key, CACHED_PAGE, 30)
+    stored = client.portal.call(redis_client.exists, stale_key(key))
+    assert bool(stored) is kept